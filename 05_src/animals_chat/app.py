@@ -5,6 +5,8 @@ from dotenv import load_dotenv
 import os
 
 from utils.logger import get_logger
+from utils.spans import request_span
+from utils.profiling import profiled
 
 _logs = get_logger(__name__)
 
@@ -12,6 +14,8 @@ llm = get_animals_chat_agent()
 
 load_dotenv('.secrets')
 
+@profiled("animals_chat")
+@request_span("animals_chat")
 def animals_chat(message: str, history: list[dict]) -> str:
     langchain_messages = []
     n = 0
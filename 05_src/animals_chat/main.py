@@ -1,16 +1,19 @@
 from typing import Literal
 from langgraph.graph import StateGraph, START, END
-from langchain.chat_models import init_chat_model
 from langchain.tools import tool
 from langchain_core.messages import AnyMessage, SystemMessage, ToolMessage
 from typing_extensions import TypedDict, Annotated
+import contextvars
 import operator
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 from dotenv import load_dotenv
 from animals_chat.prompts import return_instructions_root
-import json
-import requests
+from utils.fact_pool import cat_facts, dog_facts
 from utils.logger import get_logger
+from utils.model_registry import get_chat_model
+from utils.spans import span, timed
 import os
 
 
@@ -26,13 +29,8 @@ def get_cat_facts(n:int=1):
     """
     Returns n cat facts from the Meowfacts API.
     """
-    url = "https://meowfacts.herokuapp.com/"
-    params = {
-        "count": n
-    }
-    response = requests.get(url, params=params)
-    resp_dict = json.loads(response.text)
-    facts_list = resp_dict.get("data", [])
+    # Served from the background-refilled pool; live fetch only when it is empty
+    facts_list = cat_facts.take(n)
     facts = "\n".join([f"{i+1}. {fact}\n" for i, fact in enumerate(facts_list)])
     return facts
 
@@ -41,30 +39,31 @@ def get_dog_facts(n:int=1):
     """
     Returns n dog facts from the Dog API.
     """
-    url = "http://dogapi.dog/api/v2/facts"
-    params = {
-        "limit": n
-    }
-    response = requests.get(url, params=params)
-    resp_dict = json.loads(response.text)
-    facts_list = resp_dict.get("data", [])
-    facts = "\n".join([f"{i+1}. {fact['attributes']['body']}\n" for i, fact in enumerate(facts_list)])
+    # Served from the background-refilled pool; live fetch only when it is empty
+    facts_list = dog_facts.take(n)
+    facts = "\n".join([f"{i+1}. {fact}\n" for i, fact in enumerate(facts_list)])
     return facts
 
+tools = [get_cat_facts, get_dog_facts]
+tools_by_name = {tool.name: tool for tool in tools}
+
+tool_timeout = float(os.getenv("TOOL_TIMEOUT", 15))
+tool_pool = ThreadPoolExecutor(max_workers=int(os.getenv("TOOL_WORKERS", 8)))
+
 def get_model_with_tools():
-    model = init_chat_model(
+    # Built once per process and reused by every graph step
+    model_with_tools = get_chat_model(
         "openai:gpt-4o-mini",
+        tools=tools,
         temperature=0.7
     )
-    # Augment the LLM with tools
-    tools = [get_cat_facts, get_dog_facts]
-    model_with_tools = model.bind_tools(tools)
     return model_with_tools
 
 class MessagesState(TypedDict):
     messages: Annotated[list[AnyMessage], operator.add]
     llm_calls: int
 
+@timed("llm")
 def llm_call(state: dict):
     """LLM decides whether to call a tool or not"""
     model_with_tools = get_model_with_tools()
@@ -82,16 +81,37 @@ def llm_call(state: dict):
         "llm_calls": state.get('llm_calls', 0) + 1
     }
 
+def run_tool_call(tool_call: dict) -> str:
+    tool = tools_by_name[tool_call["name"]]
+    with span("tool", tool_call["name"]):
+        return tool.invoke(tool_call["args"])
+
 def tool_node(state: dict):
-    """Performs the tool call"""
-    tools = [get_cat_facts, get_dog_facts]
-    tools_by_name = {tool.name: tool for tool in tools}
+    """Performs the tool calls concurrently, returning their messages in call order"""
+    tool_calls = state["messages"][-1].tool_calls
+    # Copy the context so tool spans count towards the current request
+    futures = [
+        tool_pool.submit(contextvars.copy_context().run, run_tool_call, tool_call)
+        for tool_call in tool_calls
+    ]
+    # All calls start together, so one deadline gives each call the full timeout
+    deadline = time.monotonic() + tool_timeout
 
     result = []
-    for tool_call in state["messages"][-1].tool_calls:
-        tool = tools_by_name[tool_call["name"]]
-        observation = tool.invoke(tool_call["args"])
-        result.append(ToolMessage(content=observation, tool_call_id=tool_call["id"]))
+    for tool_call, future in zip(tool_calls, futures):
+        try:
+            observation = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            result.append(ToolMessage(content=observation, tool_call_id=tool_call["id"]))
+        except FutureTimeoutError:
+            _logs.warning(f'Tool {tool_call["name"]} timed out after {tool_timeout}s')
+            result.append(ToolMessage(
+                content=f"Error: {tool_call['name']} timed out after {tool_timeout} seconds.",
+                tool_call_id=tool_call["id"],
+                status="error"))
+        except Exception as e:
+            _logs.warning(f'Tool {tool_call["name"]} failed: {e}')
+            result.append(ToolMessage(
+                content=f"Error: {e!r}", tool_call_id=tool_call["id"], status="error"))
     return {"messages": result}
 
 def should_continue(state: MessagesState) -> Literal["tool_node", END]:
@@ -0,0 +1,67 @@
+"""
+Throughput benchmark for _parse_llm_compiler_action_args.
+
+Parses math(...) calls whose `context=[...]` list grows from 10 to 10k items,
+plus a tool with many keyword arguments, and reports parsed MB/s.
+
+Run from 05_src:
+
+    python -m benchmarks.bench_action_args
+"""
+
+import time
+from typing import List, Optional
+
+from langchain_core.tools import StructuredTool
+from pydantic import create_model
+
+from output_parser import _parse_llm_compiler_action_args
+
+CONTEXT_SIZES = (10, 100, 1000, 10000)
+N_KWARGS = 200
+
+
+def _math(problem: str, context: Optional[List[str]] = None) -> str:
+    return problem
+
+
+def context_call(n_items: int) -> str:
+    context = ", ".join(f'"${i}: value {i}, unit=kg"' for i in range(1, n_items + 1))
+    return f'problem="sum of the values", context=[{context}]'
+
+
+def wide_tool(n_args: int) -> StructuredTool:
+    fields = {f"arg{i}": (str, ...) for i in range(n_args)}
+    schema = create_model("WideArgs", **fields)
+    return StructuredTool.from_function(
+        name="wide", func=lambda **kwargs: kwargs, args_schema=schema, description="wide"
+    )
+
+
+def throughput(args: str, tool, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parsed = _parse_llm_compiler_action_args(args, tool)
+        best = min(best, time.perf_counter() - start)
+    assert parsed
+    return len(args) / best / 1e6
+
+
+def main():
+    math_tool = StructuredTool.from_function(
+        name="math", func=_math, description="math"
+    )
+    for n_items in CONTEXT_SIZES:
+        args = context_call(n_items)
+        rate = throughput(args, math_tool)
+        print(f"context=[{n_items:>5} items] {len(args):>9} chars: {rate:7.2f} MB/s")
+
+    tool = wide_tool(N_KWARGS)
+    args = ", ".join(f'arg{i}="value {i}"' for i in range(N_KWARGS))
+    rate = throughput(args, tool)
+    print(f"{N_KWARGS} keyword args  {len(args):>9} chars: {rate:7.2f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
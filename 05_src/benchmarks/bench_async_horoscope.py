@@ -0,0 +1,189 @@
+"""
+Load test of the sync and async streaming horoscope handlers.
+
+A local stub plays both the OpenAI Responses endpoint (streamed over SSE)
+and the horoscope service. Every chat turn makes one tool-calling round
+and one streamed answer, like a real horoscope question.
+
+The sync handler runs on a pool of 40 worker threads, which is the limit
+Gradio puts on sync handlers. The async handler runs every session on one
+event loop. With more sessions than threads, sync sessions queue for a
+thread while async sessions all make progress; at the largest counts the
+async handler is bound by client-side CPU (request serialisation in the
+OpenAI SDK) rather than by threads.
+
+Run from 05_src:
+
+    python -m benchmarks.bench_async_horoscope
+"""
+
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SESSIONS = (10, 100, 400)
+THREADS = 40
+MODEL_LATENCY = 1.0
+TOKEN_DELAY = 0.02
+SERVICE_DELAY = 0.05
+ANSWER = "The stars favour bold moves today , Aries .".split(" ")
+
+
+class StubOpenAI(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        # The horoscope service
+        time.sleep(SERVICE_DELAY)
+        body = json.dumps(
+            {"data": {"date": "today", "horoscope_data": "Bold moves pay off."}}
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        # The Responses API, always streamed
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        answered = any(
+            isinstance(item, dict) and item.get("type") == "function_call_output"
+            for item in request["input"]
+        )
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(MODEL_LATENCY)
+        if answered:
+            for word in ANSWER:
+                self.event({"type": "response.output_text.delta", "delta": word + " "})
+                time.sleep(TOKEN_DELAY)
+            output = [
+                {
+                    "type": "message",
+                    "id": "msg_1",
+                    "role": "assistant",
+                    "status": "completed",
+                    "content": [{"type": "output_text", "text": " ".join(ANSWER)}],
+                }
+            ]
+        else:
+            output = [
+                {
+                    "type": "function_call",
+                    "id": "fc_1",
+                    "call_id": "call_1",
+                    "name": "get_horoscope",
+                    "arguments": json.dumps({"sign": "Aries", "date": "TODAY"}),
+                    "status": "completed",
+                }
+            ]
+            self.event({"type": "response.output_item.done", "output_index": 0, "item": output[0]})
+        self.event(
+            {
+                "type": "response.completed",
+                "response": {"id": "resp_1", "object": "response", "status": "completed", "output": output},
+            }
+        )
+        self.wfile.write(b"0\r\n\r\n")
+
+    def event(self, data: dict):
+        payload = f"event: {data['type']}\ndata: {json.dumps(data)}\n\n".encode()
+        self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def serve(ports):
+    # In its own process, so the stub does not compete with the handlers for the GIL
+    server = StubServer(("127.0.0.1", 0), StubOpenAI)
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+
+def run_sync(handler, sessions: int):
+    # All sessions arrive at once; latency includes the wait for a worker thread
+    def session(_):
+        for text in handler("How is my day?", []):
+            pass
+        assert text.strip().endswith("Aries .")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(THREADS) as pool:
+        latencies = list(pool.map(session, range(sessions)))
+    return time.perf_counter() - start, latencies
+
+
+async def run_async(handler, sessions: int):
+    async def session():
+        async for text in handler("How is my day?", []):
+            pass
+        assert text.strip().endswith("Aries .")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(session() for _ in range(sessions)))
+    return time.perf_counter() - start, latencies
+
+
+def report(label: str, sessions: int, elapsed: float, latencies: list):
+    print(
+        f"{label:>5} handler, {sessions:>4} sessions: {sessions / elapsed:7.1f} turns/s,"
+        f" p50 {statistics.median(latencies) * 1000:7.0f} ms,"
+        f" max {max(latencies) * 1000:7.0f} ms"
+    )
+
+
+def main():
+    ports = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(ports,), daemon=True)
+    server.start()
+    base = f"http://127.0.0.1:{ports.get()}"
+    os.environ["OPENAI_BASE_URL"] = f"{base}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    os.environ["HOROSCOPE_API_URL"] = f"{base}/api/v1/get-horoscope/daily"
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stderr(devnull):
+        from horoscope_chat.main import (
+            ahoroscope_chat_stream,
+            horoscope_cache,
+            horoscope_chat_stream,
+        )
+
+        # Warm up imports and connections before measuring
+        run_sync(horoscope_chat_stream, 1)
+        for sessions in SESSIONS:
+            horoscope_cache.clear()
+            report("sync", sessions, *run_sync(horoscope_chat_stream, sessions))
+
+        # One event loop for every round, as in Gradio: the async clients
+        # are bound to the loop that first used them
+        async def run_all():
+            await run_async(ahoroscope_chat_stream, 1)
+            for sessions in SESSIONS:
+                horoscope_cache.clear()
+                report("async", sessions, *await run_async(ahoroscope_chat_stream, sessions))
+
+        asyncio.run(run_all())
+
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Concurrency benchmark for LLMCompilerPlanParser.atransform.
+
+Streams N plans at once through a single event loop. Each plan arrives token
+by token with a small delay, like a model streaming its output. If parsing
+does not block the loop, N plans take about as long as one, and a ticker
+task on the same loop keeps running on time.
+
+Run from 05_src:
+
+    python -m benchmarks.bench_async_parser
+"""
+
+import asyncio
+import time
+
+from langchain_core.tools import StructuredTool
+
+from output_parser import LLMCompilerPlanParser
+
+CONCURRENCY = (1, 10, 100)
+N_TASKS = 20
+TOKEN_SIZE = 8
+TOKEN_DELAY = 0.001
+TICK = 0.005
+
+
+def _search(query: str) -> str:
+    return query
+
+
+def synthetic_plan(n_tasks: int) -> str:
+    lines = [
+        f'{i}. search(query="item {i} after ${i - 1}")' for i in range(1, n_tasks + 1)
+    ]
+    lines.append(f"{n_tasks + 1}. join()<END_OF_PLAN>")
+    return "\n".join(lines)
+
+
+async def token_stream(plan: str):
+    for start in range(0, len(plan), TOKEN_SIZE):
+        await asyncio.sleep(TOKEN_DELAY)
+        yield plan[start : start + TOKEN_SIZE]
+
+
+async def parse_plan(parser: LLMCompilerPlanParser, plan: str) -> int:
+    return len([task async for task in parser.atransform(token_stream(plan))])
+
+
+async def ticker(stop: asyncio.Event) -> float:
+    """Largest delay of a periodic timer, i.e. how long the loop was blocked."""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        worst = max(worst, time.perf_counter() - start - TICK)
+    return worst
+
+
+async def run(parser: LLMCompilerPlanParser, n_plans: int, plan: str):
+    stop = asyncio.Event()
+    lag = asyncio.create_task(ticker(stop))
+    start = time.perf_counter()
+    counts = await asyncio.gather(*(parse_plan(parser, plan) for _ in range(n_plans)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    assert all(count == N_TASKS + 1 for count in counts)
+    return elapsed, await lag
+
+
+def main():
+    search = StructuredTool.from_function(
+        name="search", func=_search, description="search"
+    )
+    parser = LLMCompilerPlanParser(tools=[search])
+    plan = synthetic_plan(N_TASKS)
+    for n_plans in CONCURRENCY:
+        elapsed, lag = asyncio.run(run(parser, n_plans, plan))
+        print(
+            f"{n_plans:>4} concurrent plans: {elapsed * 1000:8.1f} ms wall,"
+            f" {n_plans / elapsed:8.1f} plans/s, max loop lag {lag * 1000:6.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Query-embedding cache against a slow stub of the embedding API.
+
+The stub sleeps like an embedding request and returns a deterministic
+1536-dimension vector per text. A stream of recommendation queries, drawn
+with a Zipf-like skew from a pool of popular queries and written with
+varying case and spacing, is embedded live and through a
+CachedEmbeddingFunction smaller than the pool, so LRU eviction is
+exercised. A second cache opened on the same directory, as another process
+would, checks that entries persist and are shared. Last, the script times
+a hit and a put that evicts from a full cache.
+
+Run from 05_src:
+
+    python -m benchmarks.bench_embedding_cache
+"""
+
+import random
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from utils.embedding_cache import CachedEmbeddingFunction, EmbeddingCache
+
+DIM = 1536
+API_LATENCY = 0.05
+DISTINCT_QUERIES = 400
+CAPACITY = 100
+CALLS = 500
+
+TOPICS = ["shoegaze", "jazz fusion", "90s hip hop", "ambient", "post-punk", "synth pop", "folk", "metal"]
+MOODS = ["rainy day", "late night drive", "workout", "studying", "a breakup", "summer party"]
+
+
+def stub_embeddings(texts):
+    time.sleep(API_LATENCY)
+    vectors = []
+    for text in texts:
+        vector = np.random.default_rng(abs(hash(" ".join(text.lower().split())))).standard_normal(DIM)
+        vectors.append((vector / np.linalg.norm(vector)).astype(np.float32))
+    return vectors
+
+
+def query_stream():
+    random.seed(0)
+    queries = [
+        f"{random.choice(TOPICS)} albums for {random.choice(MOODS)} #{i}" for i in range(DISTINCT_QUERIES)
+    ]
+    weights = [1 / (rank + 1) for rank in range(DISTINCT_QUERIES)]
+    for query in random.choices(queries, weights, k=CALLS):
+        # The same question as users type it
+        yield random.choice([query, query.capitalize(), query.upper(), f"  {query.replace(' ', '  ')} "])
+
+
+def run(embed) -> list:
+    latencies = []
+    for query in query_stream():
+        start = time.perf_counter()
+        [vector] = embed([query])
+        latencies.append(time.perf_counter() - start)
+        assert vector.shape == (DIM,)
+    latencies.sort()
+    return latencies
+
+
+def report(label: str, latencies: list):
+    print(
+        f"{label:<7} p50 {statistics.median(latencies) * 1000:7.2f} ms,"
+        f" p90 {latencies[int(len(latencies) * 0.9)] * 1000:7.2f} ms,"
+        f" total {sum(latencies):6.1f} s"
+    )
+
+
+def main():
+    report("live", run(stub_embeddings))
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = EmbeddingCache("text-embedding-3-small", cache_dir=cache_dir, capacity=CAPACITY)
+        report("cached", run(CachedEmbeddingFunction(stub_embeddings, cache)))
+        stats = cache.stats()
+        print(f"hit rate {stats['hit_rate']:.1%}, {stats['size']}/{stats['capacity']} entries")
+
+        # Another process opening the same directory sees every entry
+        cache.flush()
+        reopened = EmbeddingCache("text-embedding-3-small", cache_dir=cache_dir, capacity=CAPACITY)
+        report("reopen", run(CachedEmbeddingFunction(stub_embeddings, reopened)))
+        print(f"hit rate after reopening {reopened.stats()['hit_rate']:.1%} (only the {CAPACITY} most recent queries are kept)")
+
+        popular = next(query_stream())
+        start = time.perf_counter()
+        for _ in range(1000):
+            [vector] = cache.get_many([popular])
+        assert vector is not None
+        print(f"cache hit {(time.perf_counter() - start) * 1000:.1f} us")
+
+        # A miss on a full cache evicts one row and writes it, not the whole cache
+        new_vector = np.ones(DIM, dtype=np.float32)
+        start = time.perf_counter()
+        for i in range(1000):
+            cache.put_many([f"never asked before #{i}"], [new_vector])
+        print(f"cache put on a full cache {(time.perf_counter() - start) * 1000:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Fact pool against a slow, spiky stub of the cat facts API.
+
+The stub answers after a base delay, with a long tail on some requests,
+like the free-tier hosts behind get_cat_facts and get_dog_facts. The script
+serves a stream of tool calls live and from a FactPool, and reports call
+latency, hit rate, refill latency and whether any chat heard a fact twice.
+
+Run from 05_src:
+
+    python -m benchmarks.bench_fact_pool
+"""
+
+import json
+import random
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from utils.fact_pool import FactPool
+from utils.http_client import http_get
+
+N_FACTS = 90
+BASE_DELAY = 0.05
+TAIL_DELAY = 0.5
+TAIL_RATE = 0.1
+CALLS = 200
+CHAT_LENGTH = 10
+CALL_INTERVAL = 0.01
+
+
+class StubFacts(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        count = int(parse_qs(urlparse(self.path).query)["count"][0])
+        time.sleep(TAIL_DELAY if random.random() < TAIL_RATE else BASE_DELAY)
+        facts = random.sample([f"Cat fact number {i}." for i in range(N_FACTS)], min(count, N_FACTS))
+        body = json.dumps({"data": facts}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(take) -> tuple:
+    """CALLS tool calls of one or two facts; a chat is CHAT_LENGTH consecutive calls."""
+    latencies = []
+    repeats = 0
+    heard = set()
+    for call in range(CALLS):
+        if call % CHAT_LENGTH == 0:
+            heard = set()
+        start = time.perf_counter()
+        facts = take(random.choice((1, 2)))
+        latencies.append(time.perf_counter() - start)
+        repeats += sum(fact in heard for fact in facts)
+        heard.update(facts)
+        time.sleep(CALL_INTERVAL)
+    latencies.sort()
+    return latencies, repeats
+
+
+def report(label: str, latencies: list, repeats: int):
+    print(
+        f"{label:<6} p50 {statistics.median(latencies) * 1000:7.2f} ms,"
+        f" p99 {latencies[int(len(latencies) * 0.99)] * 1000:7.1f} ms,"
+        f" repeats within a chat: {repeats}"
+    )
+
+
+def main():
+    random.seed(0)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubFacts)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    def fetch(count):
+        return http_get(url, params={"count": count}).json()["data"]
+
+    report("live", *run(fetch))
+    pool = FactPool("cat", fetch)
+    report("pool", *run(pool.take))
+    stats = pool.stats()
+    print(
+        f"pool hit rate {stats['hit_rate']:.1%}, {stats['refills']} refills,"
+        f" refill p50 {stats['refill_p50_s'] * 1000:.0f} ms, max {stats['refill_max_s'] * 1000:.0f} ms"
+    )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Horoscope cache against a local stub of the horoscope service.
+
+The stub answers like the real API after a fixed delay and counts the
+requests it receives. The script checks that:
+
+- concurrent identical lookups share one upstream request and get its payload,
+- the service receives the day upper-cased, as the key stores it,
+- "today", " Today " and TODAY share one entry,
+- every (sign, day) pair is fetched once however often it is asked for,
+- prefetch warms all 12 signs for today, and counts none when the service fails,
+
+and reports the latency of cold and warm lookups.
+
+Run from 05_src:
+
+    python -m benchmarks.bench_horoscope_cache
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from utils.horoscope_cache import SIGNS, HoroscopeCache
+
+SERVICE_DELAY = 0.05
+CONCURRENCY = 32
+REPEATS = 10
+
+
+class StubHoroscopeService(BaseHTTPRequestHandler):
+    requests = 0
+    days = set()
+    lock = threading.Lock()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        with StubHoroscopeService.lock:
+            StubHoroscopeService.requests += 1
+            StubHoroscopeService.days.add(params["day"][0])
+        time.sleep(SERVICE_DELAY)
+        if not url.path.endswith("/daily"):
+            self.send_error(404)
+            return
+        body = json.dumps(
+            {
+                "data": {
+                    "date": params["day"][0],
+                    "horoscope_data": f"A good day for {params['sign'][0]}.",
+                },
+                "status": 200,
+                "success": True,
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections under the concurrent bursts
+    request_queue_size = 128
+
+
+def upstream_requests(reset: bool = False) -> int:
+    with StubHoroscopeService.lock:
+        count = StubHoroscopeService.requests
+        if reset:
+            StubHoroscopeService.requests = 0
+    return count
+
+
+def main():
+    server = StubServer(("127.0.0.1", 0), StubHoroscopeService)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/v1/get-horoscope/daily"
+
+    # Concurrent identical misses are coalesced
+    cache = HoroscopeCache(url=url)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(CONCURRENCY) as pool:
+        responses = list(pool.map(lambda _: cache.get("aries", "today"), range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+    assert all(p["data"]["horoscope_data"] == "A good day for Aries." for p in responses)
+    assert upstream_requests(reset=True) == 1
+    assert StubHoroscopeService.days == {"TODAY"}
+    print(f"{CONCURRENCY} concurrent identical lookups: 1 upstream request, {elapsed * 1000:.1f} ms")
+
+    # Spellings of a day normalize to the one key that is sent upstream
+    cache.get("Aries", " Today ")
+    cache.get("ARIES", "TODAY")
+    assert upstream_requests(reset=True) == 0
+    print('"today", " Today " and TODAY share one entry')
+
+    # Mixed traffic: every (sign, day) pair is fetched once
+    cache.clear()
+    lookups = [(sign, day) for sign in SIGNS for day in ("YESTERDAY", "TODAY", "TOMORROW")]
+    lookups *= REPEATS
+    latencies = []
+
+    def lookup(args):
+        t0 = time.perf_counter()
+        cache.get(*args)
+        latencies.append(time.perf_counter() - t0)
+
+    with ThreadPoolExecutor(CONCURRENCY) as pool:
+        list(pool.map(lookup, lookups))
+    assert upstream_requests(reset=True) == len(SIGNS) * 3
+    latencies.sort()
+    print(
+        f"{len(lookups)} mixed lookups: {len(SIGNS) * 3} upstream requests,"
+        f" p50 {latencies[len(latencies) // 2] * 1000:.2f} ms,"
+        f" max {latencies[-1] * 1000:.1f} ms"
+    )
+
+    # Prefetch warms today's horoscopes, so the first lookup is a hit
+    cache = HoroscopeCache(url=url)
+    warmed = cache.prefetch()
+    assert warmed == len(SIGNS) and upstream_requests(reset=True) == len(SIGNS)
+    t0 = time.perf_counter()
+    cache.get("Pisces")
+    warm = time.perf_counter() - t0
+    assert upstream_requests() == 0
+    print(
+        f"prefetch warmed {warmed} signs; warm lookup {warm * 1e6:.1f} us"
+        f" vs {SERVICE_DELAY * 1000:.0f} ms service delay"
+    )
+
+    # Error responses are neither cached nor counted as warmed
+    broken = HoroscopeCache(url=url.replace("/daily", "/missing"))
+    assert broken.prefetch() == 0 and not broken._entries
+    print("prefetch against a failing service warmed 0 signs")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
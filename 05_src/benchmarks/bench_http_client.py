@@ -0,0 +1,135 @@
+"""
+Pooled HTTP client against a local keep-alive stub server.
+
+Compares a bare `requests.get` per call, which opens a new connection every
+time, with the shared session of utils.http_client and its async flavour.
+Also checks that retries recover from transient 503s and that a hung
+upstream fails after the read timeout instead of holding the caller.
+
+Run from 05_src:
+
+    python -m benchmarks.bench_http_client
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from utils.http_client import ahttp_get, http_get
+
+N_CALLS = 500
+CONCURRENCY = 8
+FLAKY_FAILURES = 2
+HANG = 5.0
+
+
+class StubService(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; without this, delayed ACKs stall keep-alive
+    disable_nagle_algorithm = True
+    connections = set()
+    flaky_calls = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with StubService.lock:
+            StubService.connections.add(self.client_address)
+        if self.path.startswith("/hang"):
+            time.sleep(HANG)
+        elif self.path.startswith("/flaky"):
+            with StubService.lock:
+                StubService.flaky_calls += 1
+                failing = StubService.flaky_calls <= FLAKY_FAILURES
+            if failing:
+                self.reply(503, b'{"error": "busy"}')
+                return
+        self.reply(200, b'{"data": ["Cats sleep 70% of their lives."]}')
+
+    def reply(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def connections_used() -> int:
+    with StubService.lock:
+        count = len(StubService.connections)
+        StubService.connections.clear()
+    return count
+
+
+def run_sync(get, url: str, workers: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        responses = list(pool.map(lambda _: get(url, params={"count": 1}), range(N_CALLS)))
+    elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses)
+    return elapsed
+
+
+async def run_async(url: str) -> float:
+    start = time.perf_counter()
+    responses = await asyncio.gather(
+        *(ahttp_get(url, params={"count": 1}) for _ in range(N_CALLS))
+    )
+    elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses)
+    return elapsed
+
+
+def report(label: str, elapsed: float):
+    print(
+        f"{label:<28} {elapsed * 1000:8.1f} ms, {N_CALLS / elapsed:8.0f} calls/s,"
+        f" {connections_used():>4} connections"
+    )
+
+
+def main():
+    server = StubServer(("127.0.0.1", 0), StubService)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    url = f"{base}/facts"
+
+    for workers in (1, CONCURRENCY):
+        report(f"requests.get, {workers} threads", run_sync(requests.get, url, workers))
+        report(f"pooled session, {workers} threads", run_sync(http_get, url, workers))
+    report("async client, gather", asyncio.run(run_async(url)))
+
+    response = http_get(f"{base}/flaky")
+    assert response.status_code == 200
+    print(f"sync: recovered after {FLAKY_FAILURES} x 503")
+    StubService.flaky_calls = 0
+    response = asyncio.run(ahttp_get(f"{base}/flaky"))
+    assert response.status_code == 200
+    print(f"async: recovered after {FLAKY_FAILURES} x 503")
+
+    start = time.perf_counter()
+    try:
+        http_get(f"{base}/hang", timeout=(1.0, 0.1))
+    except requests.exceptions.ConnectionError:
+        # Read timeouts are retried, then surface as a ConnectionError
+        pass
+    print(
+        f"upstream hanging {HANG:.0f} s: gave up after"
+        f" {(time.perf_counter() - start) * 1000:.0f} ms including retries"
+    )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
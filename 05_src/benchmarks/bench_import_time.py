@@ -0,0 +1,78 @@
+"""
+Cold-start import time of course_chat, with a budget.
+
+Imports the module in a fresh interpreter under -X importtime several
+times, and reports the median cumulative import time and the packages
+that cost the most. Exits with status 1 when the median is over the
+budget (IMPORT_BUDGET_S, in seconds) or when a dependency that should
+load on first use (Chroma, SQLAlchemy, pandas, fastmcp) is imported
+eagerly, so it can gate CI.
+
+Run from 05_src:
+
+    python -m benchmarks.bench_import_time [module ...]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+from collections import Counter
+
+TARGETS = ("course_chat.main",)
+RUNS = 5
+BUDGET_S = float(os.getenv("IMPORT_BUDGET_S", 2.5))
+LAZY_MODULES = ("chromadb", "sqlalchemy", "pandas", "fastmcp")
+TOP = 8
+
+
+def import_profile(module: str) -> dict:
+    """{imported module: (self us, cumulative us, nesting level)} for one cold import."""
+    env = dict(os.environ, LANGSMITH_TRACING="false")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        level = (len(name) - len(name.lstrip())) // 2
+        profile[name.strip()] = (int(self_us), int(cumulative_us), level)
+    return profile
+
+
+def check(module: str) -> bool:
+    profiles = [import_profile(module) for _ in range(RUNS)]
+    totals = [profile[module][1] / 1e6 for profile in profiles]
+    median = statistics.median(totals)
+    print(f"{module}: median {median:.3f} s over {RUNS} cold imports (budget {BUDGET_S:.2f} s)")
+
+    by_package = Counter()
+    for name, (self_us, _, _) in profiles[-1].items():
+        by_package[name.split(".")[0]] += self_us
+    for package, self_us in by_package.most_common(TOP):
+        print(f"  {package:<24} {self_us / 1000:8.1f} ms")
+
+    ok = median <= BUDGET_S
+    if not ok:
+        print(f"  FAIL: over budget by {median - BUDGET_S:.3f} s")
+    eager = sorted({name.split(".")[0] for name in profiles[-1]} & set(LAZY_MODULES))
+    if eager:
+        print(f"  FAIL: imported eagerly: {', '.join(eager)}")
+        ok = False
+    return ok
+
+
+def main():
+    targets = sys.argv[1:] or TARGETS
+    results = [check(module) for module in targets]
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Request-path cost of logging under concurrency.
+
+Simulates concurrent Gradio requests: every worker thread logs a series of
+messages, waiting a millisecond between them as a request waits on the
+network, and we time each `_logs.info` call. The synchronous file + stream
+handlers that utils.logger used to attach are compared with the queue-based
+backend. The script fails unless the queue backend's p99 stays under
+P99_BUDGET_US at every concurrency above one request, and below the
+synchronous backend's p99 at the highest one. (With a single request, the
+p99 is dominated by the thread waking up from its wait, not by logging.)
+
+Run from 05_src:
+
+    python -m benchmarks.bench_logging
+"""
+
+import contextlib
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+CONCURRENCY = (1, 8, 32)
+MESSAGES_PER_REQUEST = 200
+WORK_BETWEEN_MESSAGES = 0.001
+P99_BUDGET_US = 1000
+# Best of this many runs per point, so one scheduler hiccup does not fail the check
+ROUNDS = 3
+
+
+def sync_logger(log_dir: str, stream) -> logging.Logger:
+    """The handlers get_logger used to attach: file and stream, inline."""
+    logger = logging.getLogger("bench.sync")
+    logger.handlers.clear()
+    logger.propagate = False
+    f_handler = logging.FileHandler(os.path.join(log_dir, "sync.log"))
+    f_handler.setFormatter(
+        logging.Formatter(
+            "%(asctime)s, %(name)s, %(filename)s, %(lineno)d, %(funcName)s,"
+            " %(levelname)s, %(message)s"
+        )
+    )
+    s_handler = logging.StreamHandler(stream)
+    s_handler.setFormatter(
+        logging.Formatter("%(asctime)s, %(filename)s, %(lineno)d, %(levelname)s, %(message)s")
+    )
+    logger.addHandler(f_handler)
+    logger.addHandler(s_handler)
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def request(logger: logging.Logger, latencies: list, start: threading.Barrier):
+    start.wait()
+    local = []
+    for i in range(MESSAGES_PER_REQUEST):
+        t0 = time.perf_counter()
+        logger.info(f"User message: request payload {i}")
+        local.append(time.perf_counter() - t0)
+        # The request waits on the network between log lines
+        time.sleep(WORK_BETWEEN_MESSAGES)
+    latencies.extend(local)
+
+
+def measure(logger: logging.Logger, n_requests: int):
+    latencies = []
+    start = threading.Barrier(n_requests)
+    threads = [
+        threading.Thread(target=request, args=(logger, latencies, start))
+        for _ in range(n_requests)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    p50 = statistics.median(latencies)
+    p99 = latencies[int(len(latencies) * 0.99)]
+    return p50, p99
+
+
+def main():
+    # Left open: the listener thread may still be draining the queue at exit
+    devnull = open(os.devnull, "w")
+    with tempfile.TemporaryDirectory() as log_dir:
+        # The listener's stream handler binds sys.stderr when it is created
+        with contextlib.redirect_stderr(devnull):
+            from utils.logger import get_logger
+
+            loggers = {
+                "sync": sync_logger(log_dir, devnull),
+                "queue": get_logger("bench.queue", log_dir=log_dir),
+            }
+            p99s = {}
+            for label, logger in loggers.items():
+                for n_requests in CONCURRENCY:
+                    p50, p99 = min(
+                        (measure(logger, n_requests) for _ in range(ROUNDS)), key=lambda r: r[1]
+                    )
+                    p99s[label, n_requests] = p99
+                    print(
+                        f"{label:>5} backend, {n_requests:>3} concurrent requests:"
+                        f" p50 {p50 * 1e6:7.1f} us, p99 {p99 * 1e6:8.1f} us per call"
+                    )
+
+    for n_requests in CONCURRENCY[1:]:
+        assert p99s["queue", n_requests] * 1e6 <= P99_BUDGET_US, (
+            f"queue backend p99 at {n_requests} requests is over budget:"
+            f" {p99s['queue', n_requests] * 1e6:.1f} us > {P99_BUDGET_US} us"
+        )
+    top = CONCURRENCY[-1]
+    assert p99s["queue", top] < p99s["sync", top], "queue backend p99 is not below sync"
+    print("queue backend p99 is flat")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Per-step cost of building a tool-bound chat model.
+
+animals_chat used to call init_chat_model and bind_tools on every graph
+step, and course_chat called bind_tools on every step. This times that
+construction against a lookup in utils.model_registry. It also checks that
+the registry hands every step the same client, so they share one
+connection pool. No requests are sent, so no API key is needed.
+
+Run from 05_src:
+
+    python -m benchmarks.bench_model_registry
+"""
+
+import os
+import time
+
+from langchain.chat_models import init_chat_model
+from langchain_core.tools import tool
+
+from utils.model_registry import get_chat_model
+
+STEPS = 200
+MODEL = "openai:gpt-4o-mini"
+
+
+@tool
+def get_cat_facts(n: int = 1) -> str:
+    """Returns n cat facts."""
+    return ""
+
+
+@tool
+def get_dog_facts(n: int = 1) -> str:
+    """Returns n dog facts."""
+    return ""
+
+
+TOOLS = [get_cat_facts, get_dog_facts]
+
+
+def per_call():
+    return init_chat_model(MODEL, temperature=0.7).bind_tools(TOOLS)
+
+
+def registry():
+    return get_chat_model(MODEL, tools=TOOLS, temperature=0.7)
+
+
+def time_steps(build) -> float:
+    start = time.perf_counter()
+    for _ in range(STEPS):
+        build()
+    return (time.perf_counter() - start) / STEPS
+
+
+def main():
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    # Import and warm both paths once
+    per_call()
+    registry()
+
+    old = time_steps(per_call)
+    new = time_steps(registry)
+    print(f"init_chat_model + bind_tools per step: {old * 1e6:9.1f} us")
+    print(f"registry lookup per step:              {new * 1e6:9.1f} us ({old / new:.0f}x less)")
+
+    # Keep the models alive so ids are not reused
+    for label, build in (("per-call builds", per_call), ("registry lookups", registry)):
+        models = [build() for _ in range(5)]
+        clients = {id(model.bound.root_client) for model in models}
+        print(f"OpenAI clients over 5 {label}: {len(clients)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Micro-benchmark for LLMCompilerPlanParser.ingest_token.
+
+Streams a synthetic plan one character at a time and checks that the cost of
+scanning, and of building the tasks and their PlanGraph, grows linearly with
+the number of tasks.
+
+Run from 05_src:
+
+    python -m benchmarks.bench_plan_parser
+"""
+
+import gc
+import time
+
+from langchain_core.tools import StructuredTool
+
+from output_parser import (
+    _ACTION_REGEX,
+    _THOUGHT_REGEX,
+    LLMCompilerPlanParser,
+    PlanGraph,
+)
+
+N_TASKS = 5000
+SIZES = (1000, 2000, N_TASKS)
+# Allowed drift of the per-character cost between the smallest and largest plan
+LINEARITY_TOLERANCE = 2.0
+
+
+class _ScanOnlyParser(LLMCompilerPlanParser):
+    """Parser that recognises lines but skips tool lookup and argument parsing."""
+
+    def _parse_task(self, line, thought=None):
+        task = None
+        if match := _THOUGHT_REGEX.match(line):
+            thought = match.group(1)
+        elif match := _ACTION_REGEX.match(line):
+            task = match.groups()
+            thought = None
+        return task, thought
+
+
+def synthetic_plan(n_tasks: int) -> str:
+    lines = []
+    for i in range(1, n_tasks + 1):
+        if i % 3 == 0:
+            lines.append(f"Thought: I need the result of step {i - 1}")
+        lines.append(f'{i}. search(query="item {i} after ${i - 1}")')
+    lines.append(f"{n_tasks + 1}. join()<END_OF_PLAN>")
+    return "\n".join(lines)
+
+
+def time_stream(
+    parser: LLMCompilerPlanParser, plan: str, build_graph: bool, repeat: int = 3
+) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        graph = PlanGraph()
+        gc.collect()
+        gc.disable()
+        start = time.perf_counter()
+        for task in parser._transform(iter(plan)):
+            if build_graph:
+                graph.add(task)
+        best = min(best, time.perf_counter() - start)
+        gc.enable()
+    return best
+
+
+def _search(query: str) -> str:
+    return query
+
+
+def check_linear(label: str, parser: LLMCompilerPlanParser, build_graph: bool):
+    per_char = {}
+    print(label)
+    for n_tasks in SIZES:
+        plan = synthetic_plan(n_tasks)
+        elapsed = time_stream(parser, plan, build_graph)
+        per_char[n_tasks] = elapsed / len(plan)
+        print(
+            f"{n_tasks:>6} tasks, {len(plan):>8} chars: {elapsed * 1000:8.1f} ms"
+            f" ({per_char[n_tasks] * 1e9:6.1f} ns/char)"
+        )
+
+    ratio = per_char[SIZES[-1]] / per_char[SIZES[0]]
+    print(f"per-char cost ratio {SIZES[-1]}/{SIZES[0]}: {ratio:.2f}")
+    assert ratio < LINEARITY_TOLERANCE, f"{label} is no longer linear"
+
+
+def main():
+    check_linear("scan only", _ScanOnlyParser(tools=[]), build_graph=False)
+    search = StructuredTool.from_function(
+        name="search", func=_search, description="search"
+    )
+    check_linear(
+        "tasks + PlanGraph", LLMCompilerPlanParser(tools=[search]), build_graph=True
+    )
+
+
+if __name__ == "__main__":
+    main()
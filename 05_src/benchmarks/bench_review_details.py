@@ -0,0 +1,102 @@
+"""
+Review details for a page of vector hits: one query per hit against one batched query.
+
+A SQLite file stands in for the Pitchfork database, with the same reviews
+and genres tables, and some reviews in several genres. The per-hit version
+is the old additional_details: a new engine and an f-string query for every
+review id, keeping only the first genre. The batched version is
+fetch_review_details on the shared engine.
+
+Run from 05_src:
+
+    python -m benchmarks.bench_review_details
+"""
+
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+import sqlalchemy as sa
+
+from utils.reviews_db import fetch_review_details
+
+REVIEWS = 20000
+HITS = (1, 5, 10, 25)
+ROUNDS = 50
+GENRES = ["rock", "electronic", "rap", "jazz", "pop/r&b", "metal", "folk/country", "experimental"]
+
+
+def build_db(url: str):
+    random.seed(0)
+    engine = sa.create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(sa.text("CREATE TABLE reviews (reviewid INTEGER PRIMARY KEY, title TEXT, artist TEXT, score REAL)"))
+        conn.execute(sa.text("CREATE TABLE genres (reviewid INTEGER, genre TEXT)"))
+        conn.execute(sa.text("CREATE INDEX genres_reviewid ON genres (reviewid)"))
+        conn.execute(
+            sa.text("INSERT INTO reviews VALUES (:reviewid, :title, :artist, :score)"),
+            [
+                {"reviewid": i, "title": f"Album {i}", "artist": f"Artist {i % 3000}", "score": round(random.uniform(0, 10), 1)}
+                for i in range(REVIEWS)
+            ],
+        )
+        conn.execute(
+            sa.text("INSERT INTO genres VALUES (:reviewid, :genre)"),
+            [
+                {"reviewid": i, "genre": genre}
+                for i in range(REVIEWS)
+                for genre in random.sample(GENRES, random.choice((1, 1, 2, 3)))
+            ],
+        )
+    engine.dispose()
+
+
+def per_hit_details(url: str, review_id: str):
+    engine = sa.create_engine(url)
+    query = f"""
+    SELECT r.reviewid, r.title, r.artist, r.score, g.genre
+    FROM reviews AS r
+    LEFT JOIN genres as g ON r.reviewid = g.reviewid
+    WHERE r.reviewid = '{review_id}'
+    """
+    with engine.connect() as conn:
+        result = pd.read_sql(query, conn)
+    row = result.iloc[0]
+    return {"reviewid": row["reviewid"], "album": row["title"], "score": row["score"], "artist": row["artist"]}
+
+
+def measure(fetch, hits: int) -> float:
+    timings = []
+    for _ in range(ROUNDS):
+        review_ids = [str(random.randrange(REVIEWS)) for _ in range(hits)]
+        start = time.perf_counter()
+        details = fetch(review_ids)
+        timings.append(time.perf_counter() - start)
+        assert [str(d["reviewid"]) for d in details] == review_ids
+    return statistics.median(timings)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'pitchfork.sqlite')}"
+        build_db(url)
+        engine = sa.create_engine(url, pool_pre_ping=True)
+
+        details = fetch_review_details(["7", "7"], engine=engine)
+        print(f"review 7: {details[0]['album']}, genres {details[0]['genres']}")
+
+        for hits in HITS:
+            per_hit = measure(lambda ids: [per_hit_details(url, i) for i in ids], hits)
+            batched = measure(lambda ids: fetch_review_details(ids, engine=engine), hits)
+            print(
+                f"{hits:>3} hits: per hit {per_hit * 1000:7.2f} ms,"
+                f" batched {batched * 1000:6.2f} ms ({per_hit / batched:5.1f}x)"
+            )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+In-process memory-mapped vector index against Chroma over HTTP.
+
+A synthetic corpus of clustered, 1536-dimension unit vectors (the size of
+text-embedding-3-small) is written to an MmapVectorIndex, once scanning
+every row and once with IVF lists, and queried with vectors near the
+corpus. The script reports p50/p99 query latency and recall@10 against an
+exact search. When the chromadb package is installed and a Chroma server
+answers at CHROMA_URL (default http://localhost:8000, the Docker instance
+the apps use), the same corpus is loaded into a scratch collection there
+and measured the same way; the collection is deleted afterwards.
+
+Run from 05_src:
+
+    python -m benchmarks.bench_vector_index
+"""
+
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from utils.vector_index import MmapVectorIndex, build_index
+
+N = 20000
+DIM = 1536
+CLUSTERS = 1000
+QUERIES = 200
+K = 10
+NLIST = 128
+NPROBES = (4, 8, 16)
+CHROMA_URL = os.getenv("CHROMA_URL", "http://localhost:8000")
+
+
+def corpus(rng) -> tuple:
+    centres = rng.standard_normal((CLUSTERS, DIM)).astype(np.float32)
+    labels = rng.integers(CLUSTERS, size=N)
+    vectors = centres[labels] + 1.5 * rng.standard_normal((N, DIM)).astype(np.float32)
+    queries = centres[rng.integers(CLUSTERS, size=QUERIES)] + 1.5 * rng.standard_normal((QUERIES, DIM)).astype(np.float32)
+    normalize = lambda m: m / np.linalg.norm(m, axis=1, keepdims=True)
+    return normalize(vectors), normalize(queries)
+
+
+def measure(query, queries, truth) -> tuple:
+    latencies, recalls = [], []
+    for q, expected in zip(queries, truth):
+        start = time.perf_counter()
+        ids = query(q)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(set(ids) & expected) / K)
+    latencies.sort()
+    return latencies, statistics.mean(recalls)
+
+
+def report(label: str, latencies: list, recall: float):
+    print(
+        f"{label:<22} p50 {statistics.median(latencies) * 1000:7.2f} ms,"
+        f" p99 {latencies[int(len(latencies) * 0.99)] * 1000:7.2f} ms, recall@{K} {recall:.3f}"
+    )
+
+
+def chroma_client():
+    try:
+        import chromadb
+    except ImportError:
+        return None
+    try:
+        client = chromadb.HttpClient(host=CHROMA_URL)
+        client.heartbeat()
+        return client
+    except Exception:
+        return None
+
+
+def main():
+    rng = np.random.default_rng(0)
+    vectors, queries = corpus(rng)
+    ids = [f"{i}_0" for i in range(N)]
+    documents = [f"Review chunk {i}" for i in range(N)]
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :K]
+    truth = [{ids[i] for i in row} for row in exact]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        flat_dir, ivf_dir = os.path.join(tmp, "flat"), os.path.join(tmp, "ivf")
+        build_index(flat_dir, ids, vectors, documents)
+        start = time.perf_counter()
+        build_index(ivf_dir, ids, vectors, documents, nlist=NLIST)
+        print(f"{N} x {DIM} corpus; IVF build with {NLIST} lists took {time.perf_counter() - start:.1f} s")
+
+        flat = MmapVectorIndex(flat_dir)
+        report("mmap, every row", *measure(lambda q: flat.query([q], K)["ids"][0], queries, truth))
+        for nprobe in NPROBES:
+            ivf = MmapVectorIndex(ivf_dir, nprobe=nprobe)
+            report(f"mmap, IVF nprobe={nprobe}", *measure(lambda q: ivf.query([q], K)["ids"][0], queries, truth))
+
+    client = chroma_client()
+    if client is None:
+        print(f"chroma: no server at {CHROMA_URL} (or chromadb not installed), skipped")
+        return
+    collection = client.create_collection("bench_vector_index", metadata={"hnsw:space": "cosine"})
+    try:
+        for start in range(0, N, 1000):
+            collection.add(
+                ids=ids[start:start + 1000],
+                embeddings=vectors[start:start + 1000],
+                documents=documents[start:start + 1000],
+            )
+        report(
+            "chroma over HTTP",
+            *measure(lambda q: collection.query(query_embeddings=[q], n_results=K)["ids"][0], queries, truth),
+        )
+    finally:
+        client.delete_collection("bench_vector_index")
+
+
+if __name__ == "__main__":
+    main()
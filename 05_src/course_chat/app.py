@@ -1,10 +1,13 @@
 from course_chat.main import get_graph
+from course_chat.tools_music import start_warm_up
 from langchain_core.messages import HumanMessage, AIMessage
 import gradio as gr
 from dotenv import load_dotenv
 import os
 
 from utils.logger import get_logger
+from utils.spans import request_span
+from utils.profiling import profiled
 
 _logs = get_logger(__name__)
 
@@ -12,6 +15,8 @@ llm = get_graph()
 
 load_dotenv('.secrets')
 
+@profiled("course_chat")
+@request_span("course_chat")
 def course_chat(message: str, history: list[dict]) -> str:
     langchain_messages = []
     n = 0
@@ -39,4 +44,6 @@ chat = gr.ChatInterface(
 
 if __name__ == "__main__":
     _logs.info('Starting Course Chat App...')
+    # Connect to Chroma and the reviews database while Gradio starts, not on the first question
+    start_warm_up()
     chat.launch()
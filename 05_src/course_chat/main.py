@@ -1,5 +1,4 @@
 from langgraph.graph import StateGraph, MessagesState, START
-from langchain.chat_models import init_chat_model
 from langgraph.prebuilt.tool_node import ToolNode, tools_condition
 from langchain_core.messages import SystemMessage,  HumanMessage
 
@@ -13,6 +12,8 @@ from course_chat.tools_animals import get_cat_facts, get_dog_facts
 from course_chat.tools_horoscope import get_horoscope
 from course_chat.tools_music import recommend_albums
 from utils.logger import get_logger
+from utils.model_registry import get_chat_model
+from utils.spans import timed
 
 
 _logs = get_logger(__name__)
@@ -20,9 +21,7 @@ load_dotenv(".env")
 load_dotenv(".secrets")
 
 
-chat_agent = init_chat_model(
-    "openai:gpt-4o-mini",
-)
+chat_model = "openai:gpt-4o-mini"
 tools = [get_cat_facts, get_dog_facts, recommend_albums, get_horoscope]
 
 instructions = return_instructions()
@@ -30,9 +29,10 @@ instructions = return_instructions()
 
 
 # @traceable(run_type="llm")
+@timed("llm")
 def call_model(state: MessagesState):
     """LLM decides whether to call a tool or not"""
-    response = chat_agent.bind_tools(tools).invoke( [SystemMessage(content=instructions)] + state["messages"])
+    response = get_chat_model(chat_model, tools=tools).invoke( [SystemMessage(content=instructions)] + state["messages"])
     return {
         "messages": [response]
     }
@@ -1,34 +1,26 @@
 from langchain.tools import tool
-import json
-import requests
+from utils.fact_pool import cat_facts, dog_facts
+from utils.spans import timed
 
 
 @tool
+@timed("tool")
 def get_cat_facts(n:int=1):
     """
     Returns n cat facts from the Meowfacts API.
     """
-    url = "https://meowfacts.herokuapp.com/"
-    params = {
-        "count": n
-    }
-    response = requests.get(url, params=params)
-    resp_dict = json.loads(response.text)
-    facts_list = resp_dict.get("data", [])
+    # Served from the background-refilled pool; live fetch only when it is empty
+    facts_list = cat_facts.take(n)
     facts = "\n".join([f"{i+1}. {fact}\n" for i, fact in enumerate(facts_list)])
     return facts
 
 @tool
+@timed("tool")
 def get_dog_facts(n:int=1):
     """
     Returns n dog facts from the Dog API.
     """
-    url = "http://dogapi.dog/api/v2/facts"
-    params = {
-        "limit": n
-    }
-    response = requests.get(url, params=params)
-    resp_dict = json.loads(response.text)
-    facts_list = resp_dict.get("data", [])
-    facts = "\n".join([f"{i+1}. {fact['attributes']['body']}\n" for i, fact in enumerate(facts_list)])
+    # Served from the background-refilled pool; live fetch only when it is empty
+    facts_list = dog_facts.take(n)
+    facts = "\n".join([f"{i+1}. {fact}\n" for i, fact in enumerate(facts_list)])
     return facts
@@ -1,11 +1,12 @@
 from langchain.tools import tool
-import requests
-import json
+from utils.spans import timed
 from utils.logger import get_logger
+from utils.horoscope_cache import horoscope_cache
 
 _logs = get_logger(__name__)
 
 @tool
+@timed("tool")
 def get_horoscope(sign:str, date:str = "TODAY") -> str:
     """
     An API call to a horoscope service is made.
@@ -15,27 +16,22 @@ def get_horoscope(sign:str, date:str = "TODAY") -> str:
     Accepted values for date are: Date in format (YYYY-MM-DD) OR "TODAY" OR "TOMORROW" OR "YESTERDAY".
     """
     _logs.debug(f'Getting horoscope for sign {sign}, and date {date}')
-    response = get_horoscope_from_service(sign, date)
-    horoscope = get_horoscope_from_response(sign, response)
+    payload = get_horoscope_from_service(sign, date)
+    horoscope = get_horoscope_from_payload(sign, payload)
     _logs.debug(f'Horoscope result: {horoscope}')
     return horoscope
 
 
 
 def get_horoscope_from_service(sign:str, day:str):
-    url = "https://horoscope-app-api.vercel.app/api/v1/get-horoscope/daily"
-    params = {
-        "sign": sign.capitalize(),
-        "day": day.upper()
-    }
-    response = requests.get(url, params=params)
-    return response
+    # Shared cache of parsed payloads keyed on (sign, date); concurrent misses share one request
+    payload = horoscope_cache.get(sign, day)
+    return payload
 
 
 
-def get_horoscope_from_response(sign:str, response:requests.Response) -> str:
-    resp_dict = json.loads(response.text)
-    data = resp_dict.get("data")
+def get_horoscope_from_payload(sign:str, payload:dict) -> str:
+    data = payload.get("data")
     horoscope_data = data.get("horoscope_data", "No horoscope found.")
     date = data.get("date", "No date found.")
     horoscope = f"Horoscope for {sign.capitalize()} on {date}: {horoscope_data}"
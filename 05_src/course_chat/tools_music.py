@@ -1,25 +1,84 @@
 from langchain.tools import tool
-from fastmcp import FastMCP
-import chromadb
-from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
 from pydantic import BaseModel, Field
-import sqlalchemy as sa
-import pandas as pd
 from dotenv import load_dotenv
+from typing import TYPE_CHECKING
 from utils.logger import get_logger
+from utils.reviews_db import fetch_review_details, get_engine
+from utils.spans import span, timed
 import os
+import threading
 _logs = get_logger(__name__)
 load_dotenv()
 load_dotenv(".secrets")
 
+if TYPE_CHECKING:
+    import chromadb
+
 
 vector_db_client_url="http://localhost:8000"
-chroma = chromadb.HttpClient(host=vector_db_client_url)
-collection = chroma.get_collection(name="pitchfork_reviews", 
-                                   embedding_function=OpenAIEmbeddingFunction(
-                                       api_key = os.getenv("OPENAI_API_KEY"),
-                                       model_name="text-embedding-3-small")
-                                   )
+# "chroma" queries the Chroma server; "mmap" searches an exported copy in-process (see utils.vector_index)
+vector_backend = os.getenv("VECTOR_BACKEND", "chroma").lower()
+vector_index_dir = os.getenv("VECTOR_INDEX_DIR", "./cache/pitchfork_reviews/")
+embedding_model = "text-embedding-3-small"
+_collection = None
+_collection_lock = threading.Lock()
+_query_embedder = None
+_query_embedder_lock = threading.Lock()
+
+
+def get_query_embedder():
+    """Embeds queries with the collection's model, skipping the embedding API for queries seen before."""
+    global _query_embedder
+    if _query_embedder is None:
+        with _query_embedder_lock:
+            if _query_embedder is None:
+                from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
+                from utils.embedding_cache import CachedEmbeddingFunction, get_embedding_cache
+                _query_embedder = CachedEmbeddingFunction(
+                    OpenAIEmbeddingFunction(api_key = os.getenv("OPENAI_API_KEY"), model_name=embedding_model),
+                    get_embedding_cache(embedding_model))
+    return _query_embedder
+
+
+def get_collection():
+    """The pitchfork_reviews collection, connected on first use so importing this module needs no Chroma server."""
+    global _collection
+    if _collection is None:
+        with _collection_lock:
+            if _collection is None and vector_backend == "mmap":
+                from utils.vector_index import get_vector_index
+                _collection = get_vector_index(vector_index_dir)
+            elif _collection is None:
+                # chromadb is slow to import; only load it when a recommendation is asked for
+                import chromadb
+                _logs.info(f'Connecting to Chroma at {vector_db_client_url}')
+                chroma = chromadb.HttpClient(host=vector_db_client_url)
+                _collection = chroma.get_collection(name="pitchfork_reviews", 
+                                                    embedding_function=get_query_embedder().embedding_function
+                                                    )
+    return _collection
+
+
+def warm_up():
+    """Open the Chroma collection and a SQL connection now instead of on the first recommendation.
+
+    Failures are logged rather than raised, so the app still starts when a backend is down."""
+    try:
+        get_collection()
+    except Exception as e:
+        _logs.warning(f'Could not open the pitchfork_reviews collection ({vector_backend}): {e}')
+    try:
+        with get_engine().connect():
+            pass
+    except Exception as e:
+        _logs.warning(f'Could not connect to the reviews database: {e}')
+
+
+def start_warm_up():
+    """Run warm_up from a daemon thread, so startup does not wait for the backends."""
+    thread = threading.Thread(target=warm_up, name="tools-music-warm-up", daemon=True)
+    thread.start()
+    return thread
 
 
 class MusicReviewData(BaseModel):
@@ -31,58 +90,36 @@ class MusicReviewData(BaseModel):
 
 
 @tool
+@timed("tool")
 def recommend_albums(query: str, n_results: int = 1) -> list[MusicReviewData]:
     """Fetches music review data based on the query. Returns n_results reviews."""
-    recommendations = get_context(query, collection, n_results)
+    recommendations = get_context(query, get_collection(), n_results)
     return recommendations
 
 
 def additional_details(review_id:str):
     _logs.debug(f'Fetching additional details for review ID: {review_id}')
-    engine = sa.create_engine(os.getenv("SQL_URL"))
-    query = f"""
-    SELECT r.reviewid,
-		r.title,
-		r.artist,
-		r.score,
-		g.genre
-    FROM reviews AS r
-    LEFT JOIN genres as g
-	    ON r.reviewid = g.reviewid
-    WHERE r.reviewid = '{review_id}'
-    """
-    with engine.connect() as conn:
-        result = pd.read_sql(query, conn)
-    if not result.empty:
-        row = result.iloc[0]
-        details = {
-            "reviewid": row['reviewid'],
-            "album": row['title'],
-            "score": row['score'],
-            "artist": row['artist']
-        }
-        return details
-    else:
-        _logs.warning(f'No details found for review ID: {review_id}')
-        return {}
+    return fetch_review_details([review_id])[0]
     
 def get_reviewid_from_custom_id(custom_id:str):
     return custom_id.split('_')[0]
 
-def get_context_data(query:str, collection:chromadb.api.models.Collection, top_n:int):
-    results = collection.query(
-        query_texts=[query],
-        n_results=top_n
-    )
-    context_data = []
-    for idx, custom_id in enumerate(results['ids'][0]):
-        review_id = get_reviewid_from_custom_id(custom_id)
-        details = additional_details(review_id)
-        details['text'] = results['documents'][0][idx]
-        context_data.append(details)
+def get_context_data(query:str, collection:"chromadb.api.models.Collection", top_n:int):
+    with span("embedding", "query"):
+        query_embeddings = get_query_embedder()([query])
+    with span("vector", "collection.query"):
+        results = collection.query(
+            query_embeddings=query_embeddings,
+            n_results=top_n
+        )
+    review_ids = [get_reviewid_from_custom_id(custom_id) for custom_id in results['ids'][0]]
+    # One query for every hit, in hit order
+    context_data = fetch_review_details(review_ids)
+    for details, text in zip(context_data, results['documents'][0]):
+        details['text'] = text
     return context_data
 
-def get_context(query:str, collection:chromadb.api.models.Collection, top_n:int):
+def get_context(query:str, collection:"chromadb.api.models.Collection", top_n:int):
     context_data = get_context_data(query, collection, top_n)
     recommendations = []
     if not context_data:
@@ -1,18 +1,33 @@
 import gradio as gr
-from horoscope_chat.main import horoscope_chat
+from horoscope_chat.main import ahoroscope_chat_stream, horoscope_chat, horoscope_chat_stream
 from dotenv import load_dotenv
 from typing import Optional
 import os
 
 from utils.logger import get_logger
+from utils.profiling import profiled
 
 _logs = get_logger(__name__)
 
 load_dotenv('.secrets')
 
+# Stream the reply token by token unless HOROSCOPE_STREAM is turned off
+streaming = os.getenv('HOROSCOPE_STREAM', 'true').lower() in ('1', 'true', 'yes')
+# Serve streaming sessions from the event loop instead of a worker thread each
+use_async = os.getenv('HOROSCOPE_ASYNC', 'true').lower() in ('1', 'true', 'yes')
+
+if streaming and use_async:
+    handler = ahoroscope_chat_stream
+elif streaming:
+    handler = horoscope_chat_stream
+else:
+    handler = horoscope_chat
+
 chat = gr.ChatInterface(
-    fn=horoscope_chat,
-    type="messages"
+    fn=profiled("horoscope_chat")(handler),
+    type="messages",
+    # Async sessions only wait on I/O, so they need no thread-sized limit
+    concurrency_limit=None if handler is ahoroscope_chat_stream else "default",
 )
 
 if __name__ == "__main__":
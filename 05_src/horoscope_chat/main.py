@@ -1,9 +1,18 @@
-from openai import OpenAI
+from openai import AsyncOpenAI, BadRequestError, NotFoundError, OpenAI
 from dotenv import load_dotenv
 from horoscope_chat.prompts import return_instructions_root
+import asyncio
+import contextvars
+import hashlib
 import json
-import requests
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 from utils.logger import get_logger
+from utils.horoscope_cache import horoscope_cache
+from utils.spans import record, request_span, span, timed
 import os
 
 
@@ -14,8 +23,15 @@ load_dotenv(".secrets")
 
 
 client = OpenAI()
+# Used by the async handlers, which serve many sessions from one event loop
+async_client = AsyncOpenAI()
 
 open_ai_model = os.getenv("OPENAI_MODEL", "gpt-4")
+max_tool_iterations = int(os.getenv("MAX_TOOL_ITERATIONS", 5))
+# Chain turns with previous_response_id instead of resending the whole history
+chain_responses = os.getenv("CHAIN_RESPONSES", "true").lower() in ("1", "true", "yes")
+
+tool_pool = ThreadPoolExecutor(max_workers=int(os.getenv("TOOL_WORKERS", 8)))
 
 tools = [
     {
@@ -45,6 +61,7 @@ tools = [
 
 
 
+@timed("tool")
 def get_horoscope(sign:str, date:str = "TODAY") -> str:
     """
     An API call to a horoscope service is made.
@@ -54,26 +71,30 @@ def get_horoscope(sign:str, date:str = "TODAY") -> str:
     Accepted values for date are: Date in format (YYYY-MM-DD) OR "TODAY" OR "TOMORROW" OR "YESTERDAY".
     """
     
-    response = get_horoscope_from_service(sign, date)
-    horoscope = get_horoscope_from_response(sign, response)
+    payload = get_horoscope_from_service(sign, date)
+    horoscope = get_horoscope_from_payload(sign, payload)
+    return horoscope
+
+
+
+@timed("tool")
+async def aget_horoscope(sign:str, date:str = "TODAY") -> str:
+    """Async get_horoscope, served by the same cache through the async HTTP client."""
+    payload = await horoscope_cache.aget(sign, date)
+    horoscope = get_horoscope_from_payload(sign, payload)
     return horoscope
 
 
 
 def get_horoscope_from_service(sign:str, day:str):
-    url = "https://horoscope-app-api.vercel.app/api/v1/get-horoscope/daily"
-    params = {
-        "sign": sign.capitalize(),
-        "day": day.upper()
-    }
-    response = requests.get(url, params=params)
-    return response
+    # Shared cache of parsed payloads keyed on (sign, date); concurrent misses share one request
+    payload = horoscope_cache.get(sign, day)
+    return payload
 
 
 
-def get_horoscope_from_response(sign:str, response:requests.Response) -> str:
-    resp_dict = json.loads(response.text)
-    data = resp_dict.get("data")
+def get_horoscope_from_payload(sign:str, payload:dict) -> str:
+    data = payload.get("data")
     horoscope_data = data.get("horoscope_data", "No horoscope found.")
     date = data.get("date", "No date found.")
     horoscope = f"Horoscope for {sign.capitalize()} on {date}: {horoscope_data}"
@@ -90,60 +111,325 @@ def sanitize_history(history: list[dict]) -> list[dict]:
     return clean_history
 
 
+def function_call_output(item, output: dict) -> dict:
+    func_call_output = {
+        "type": "function_call_output",
+        "call_id": item.call_id,
+        "output": json.dumps(output)
+    }
+    _logs.debug(f"Function call output: {func_call_output}")
+    return func_call_output
+
+
+def run_function_call(item) -> dict:
+    """Run one function call from the model and wrap its result as a function_call_output."""
+    args = json.loads(item.arguments)
+    _logs.info(f'Function call {item.name} args: {args}')
+    if item.name == "get_horoscope":
+        try:
+            output = {"horoscope": get_horoscope(**args)}
+        except Exception as e:
+            # The model still needs an output for this call_id
+            _logs.warning(f'Function call {item.name} failed: {e}')
+            output = {"error": str(e)}
+    else:
+        output = {"error": f"Unknown function {item.name}"}
+    return function_call_output(item, output)
+
+
+async def arun_function_call(item) -> dict:
+    """Async run_function_call."""
+    args = json.loads(item.arguments)
+    _logs.info(f'Function call {item.name} args: {args}')
+    if item.name == "get_horoscope":
+        try:
+            output = {"horoscope": await aget_horoscope(**args)}
+        except Exception as e:
+            _logs.warning(f'Function call {item.name} failed: {e}')
+            output = {"error": str(e)}
+    else:
+        output = {"error": f"Unknown function {item.name}"}
+    return function_call_output(item, output)
+
+
+def run_function_calls(function_calls: list) -> list[dict]:
+    """Run all function calls of a response concurrently, keeping their order."""
+    if len(function_calls) == 1:
+        return [run_function_call(function_calls[0])]
+    # Copy the context so tool spans count towards the current request
+    futures = [
+        tool_pool.submit(contextvars.copy_context().run, run_function_call, item)
+        for item in function_calls
+    ]
+    return [future.result() for future in futures]
+
+
+class ResponseChains:
+    """Last response id of each conversation, for chaining with previous_response_id.
+
+    Conversations are keyed by a digest of their history as Gradio sends it
+    back, so a session that was retried, edited or restarted simply misses
+    and falls back to the full history.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._ids: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(history: list[dict]) -> str:
+        payload = json.dumps(sanitize_history(history), sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, history: list[dict]) -> Optional[str]:
+        if not history:
+            return None
+        key = self.key(history)
+        with self._lock:
+            response_id = self._ids.get(key)
+            if response_id is not None:
+                self._ids.move_to_end(key)
+            return response_id
+
+    def put(self, history: list[dict], response_id: str) -> None:
+        key = self.key(history)
+        with self._lock:
+            self._ids[key] = response_id
+            self._ids.move_to_end(key)
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+
+    def discard(self, history: list[dict]) -> None:
+        with self._lock:
+            self._ids.pop(self.key(history), None)
+
+
+response_chains = ResponseChains()
+
+
+def _jsonable(obj):
+    return obj.model_dump() if hasattr(obj, "model_dump") else str(obj)
+
+
+class Turn:
+    """What one chat turn sends to the model, and how many bytes it sent.
+
+    With chain_responses on, a turn that continues a known conversation
+    sends only the new user message plus the previous response id, and
+    every tool round sends only its function outputs. Otherwise the full
+    history is resent on every request.
+    """
+
+    def __init__(self, message: str, history: list[dict]):
+        self.history = history
+        self.instructions = return_instructions_root()
+        self.user_msg = {
+            "role": "user",
+            "content": message
+        }
+        self.full_input = sanitize_history(history) + [self.user_msg]
+        self.previous_response_id = response_chains.get(history) if chain_responses else None
+        self.input = [self.user_msg] if self.previous_response_id else self.full_input
+        self.rounds = 0
+        self.bytes_sent = 0
+
+    def request(self, tool_choice: str = "auto", stream: bool = False) -> dict:
+        kwargs = dict(
+            model=open_ai_model,
+            instructions=self.instructions,
+            input=self.input,
+            tools=tools,
+            tool_choice=tool_choice,
+            stream=stream,
+        )
+        if self.previous_response_id:
+            kwargs["previous_response_id"] = self.previous_response_id
+        self.bytes_sent += len(json.dumps(kwargs, default=_jsonable).encode())
+        return kwargs
+
+    def drop_chain(self) -> bool:
+        """Fall back to the full history if the chain this turn started from is gone."""
+        if self.rounds or not self.previous_response_id:
+            return False
+        _logs.warning(f'Response {self.previous_response_id} is no longer available, resending history')
+        response_chains.discard(self.history)
+        self.previous_response_id = None
+        self.input = self.full_input
+        return True
+
+    def add_tool_round(self, response, outputs: list[dict]) -> None:
+        self.rounds += 1
+        if chain_responses:
+            self.previous_response_id = response.id
+            self.input = list(outputs)
+        else:
+            self.input = self.input + list(response.output) + list(outputs)
+
+    def finish(self, response, reply: str) -> None:
+        if chain_responses and response is not None:
+            assistant_msg = {"role": "assistant", "content": reply}
+            response_chains.put(self.history + [self.user_msg, assistant_msg], response.id)
+        mode = "chained" if chain_responses else "full history"
+        _logs.info(f'Sent {self.bytes_sent} bytes in {self.rounds + 1} requests ({mode})')
+
+
+def _chain_lost(error) -> bool:
+    return isinstance(error, NotFoundError) or getattr(error, "param", None) == "previous_response_id"
+
+
+def _create_response(turn: Turn, tool_choice: str, stream: bool):
+    try:
+        return client.responses.create(**turn.request(tool_choice, stream))
+    except (NotFoundError, BadRequestError) as e:
+        if not (_chain_lost(e) and turn.drop_chain()):
+            raise
+        return client.responses.create(**turn.request(tool_choice, stream))
+
+
+def create_response(turn: Turn, tool_choice: str = "auto", stream: bool = False):
+    # A stream is timed by its consumer: creating it only waits for the headers
+    if stream:
+        return _create_response(turn, tool_choice, stream)
+    with span("llm", "responses.create"):
+        return _create_response(turn, tool_choice, stream)
+
+
+@request_span("horoscope_chat")
 def horoscope_chat(message: str, history: list[dict] = []) -> str:
     _logs.info(f'User message: {message}')
     
-    instructions = return_instructions_root()
+    turn = Turn(message, history)
     
-    user_msg = {
-        "role": "user",
-        "content": message
-    }
+    response = create_response(turn)
+
+    # Run every function call of a response together, until the model stops calling tools
+    while turn.rounds <= max_tool_iterations and (
+        function_calls := [item for item in response.output if item.type == "function_call"]
+    ):
+        turn.add_tool_round(response, run_function_calls(function_calls))
+        # Out of tool rounds: the model has to answer with what it has
+        tool_choice = "none" if turn.rounds >= max_tool_iterations else "auto"
+        response = create_response(turn, tool_choice)
     
-    conversation_input = sanitize_history(history) + [user_msg]
+    turn.finish(response, response.output_text)
+    return response.output_text
+
+
+@request_span("horoscope_chat_stream")
+def horoscope_chat_stream(message: str, history: list[dict] = []):
+    """Streaming horoscope_chat: yields the reply so far as text deltas arrive.
+
+    Function calls start as soon as the stream has emitted them, while the
+    model is still writing the rest of its response.
+    """
+    _logs.info(f'User message: {message}')
+    start = time.perf_counter()
+    first_token = None
     
-    response = client.responses.create(
-        model=open_ai_model,  
-        instructions=instructions,
-        input=conversation_input,
-        tools=tools,
-        
-    )
+    turn = Turn(message, history)
     
-    conversation_input += response.output
-
-    # Handle function calls if any
-    for item in response.output:
-        if item.type == "function_call":
-            if item.name == "get_horoscope":
-                args = json.loads(item.arguments)
-                _logs.info(f'Function call args: {args}')
-                
-                # Call the horoscope function
-                horoscope_result = get_horoscope(**args)
-                
-                # Add function call result to conversation
-                
-                func_call_output = {
-                    "type": "function_call_output",
-                    "call_id": item.call_id,
-                    "output": json.dumps({
-                        "horoscope": horoscope_result
-                    })
-                }
-                
-                _logs.debug(f"Function call output: {func_call_output}")
-
-                conversation_input = conversation_input + [func_call_output]
-                
-                # Make second API call with function result
-                response = client.responses.create(
-                    model=open_ai_model,
-                    instructions=instructions,
-                    tools=tools,
-                    input=conversation_input
-                )
-                break
+    text = ""
+    tool_choice = "auto"
+    while True:
+        separator = "\n\n" if text else ""
+        pending = []
+        response = None
+        with span("llm", "responses.stream"), create_response(turn, tool_choice, stream=True) as stream:
+            for event in stream:
+                if event.type == "response.output_text.delta":
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                        record("ttft", "horoscope_chat", first_token)
+                        _logs.info(f'Time to first token: {first_token:.3f}s')
+                    text += separator + event.delta
+                    separator = ""
+                    yield text
+                elif event.type == "response.output_item.done" and event.item.type == "function_call":
+                    pending.append(
+                        tool_pool.submit(contextvars.copy_context().run, run_function_call, event.item)
+                    )
+                elif event.type == "response.completed":
+                    response = event.response
+                elif event.type == "response.failed":
+                    raise RuntimeError(f"Response failed: {event.response.error}")
+                elif event.type == "error":
+                    raise RuntimeError(f"Response stream error: {event.message}")
+        if response is None:
+            raise RuntimeError("Response stream ended without response.completed")
+
+        if not pending or turn.rounds > max_tool_iterations:
+            break
+        turn.add_tool_round(response, [future.result() for future in pending])
+        # Out of tool rounds: the model has to answer with what it has
+        tool_choice = "none" if turn.rounds >= max_tool_iterations else "auto"
+    
+    turn.finish(response, text)
+    _logs.info(f'Streamed reply after {turn.rounds} tool rounds')
+
+
+async def _acreate_response(turn: Turn, tool_choice: str, stream: bool):
+    try:
+        return await async_client.responses.create(**turn.request(tool_choice, stream))
+    except (NotFoundError, BadRequestError) as e:
+        if not (_chain_lost(e) and turn.drop_chain()):
+            raise
+        return await async_client.responses.create(**turn.request(tool_choice, stream))
+
+
+async def acreate_response(turn: Turn, tool_choice: str = "auto", stream: bool = False):
+    if stream:
+        return await _acreate_response(turn, tool_choice, stream)
+    with span("llm", "responses.create"):
+        return await _acreate_response(turn, tool_choice, stream)
+
+
+@request_span("horoscope_chat_stream")
+async def ahoroscope_chat_stream(message: str, history: list[dict] = []):
+    """Async horoscope_chat_stream.
+
+    Model calls and tool calls are awaited instead of holding a worker
+    thread, so one event loop can serve many sessions at once.
+    """
+    _logs.info(f'User message: {message}')
+    start = time.perf_counter()
+    first_token = None
     
+    turn = Turn(message, history)
     
-    return response.output_text
+    text = ""
+    tool_choice = "auto"
+    while True:
+        separator = "\n\n" if text else ""
+        pending = []
+        response = None
+        with span("llm", "responses.stream"):
+            async with await acreate_response(turn, tool_choice, stream=True) as stream:
+                async for event in stream:
+                    if event.type == "response.output_text.delta":
+                        if first_token is None:
+                            first_token = time.perf_counter() - start
+                            record("ttft", "horoscope_chat", first_token)
+                            _logs.info(f'Time to first token: {first_token:.3f}s')
+                        text += separator + event.delta
+                        separator = ""
+                        yield text
+                    elif event.type == "response.output_item.done" and event.item.type == "function_call":
+                        pending.append(asyncio.create_task(arun_function_call(event.item)))
+                    elif event.type == "response.completed":
+                        response = event.response
+                    elif event.type == "response.failed":
+                        raise RuntimeError(f"Response failed: {event.response.error}")
+                    elif event.type == "error":
+                        raise RuntimeError(f"Response stream error: {event.message}")
+        if response is None:
+            raise RuntimeError("Response stream ended without response.completed")
+
+        if not pending or turn.rounds > max_tool_iterations:
+            break
+        turn.add_tool_round(response, await asyncio.gather(*pending))
+        # Out of tool rounds: the model has to answer with what it has
+        tool_choice = "none" if turn.rounds >= max_tool_iterations else "auto"
+    
+    turn.finish(response, text)
+    _logs.info(f'Streamed reply after {turn.rounds} tool rounds')
@@ -1,8 +1,17 @@
+import ast
+import atexit
 import math
+import multiprocessing
+import os
+import queue
 import re
-from typing import List, Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Union
 
 import numexpr
+import numpy as np
 # from langchain_community.chains.ernie_functions.base import create_structured_output_runnable
 from langchain_core.messages import SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
@@ -86,27 +95,442 @@ class ExecuteCode(BaseModel):
     )
 
 
-def _evaluate_expression(expression: str) -> str:
+# Plain arithmetic that can be evaluated without asking the LLM for code
+_FAST_PATH_NODES = (
+    ast.Expression,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.Constant,
+    ast.Name,
+    ast.Load,
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.Mod,
+    ast.Pow,
+    ast.UAdd,
+    ast.USub,
+)
+_FAST_PATH_NAMES = {"pi", "e"}
+
+
+def _expression_key(expression: str) -> Optional[str]:
+    """Canonical form of `expression` for caching, or None if Python cannot parse it.
+
+    Spellings that parse to the same AST, like "2*3" and "2 * 3", share a key.
+    The key is only used to look results up; the expression itself is what
+    gets evaluated.
+    """
     try:
-        local_dict = {"pi": math.pi, "e": math.e}
-        output = str(
-            numexpr.evaluate(
-                expression.strip(),
-                global_dict={},  # restrict access to globals
-                local_dict=local_dict,  # add common mathematical functions
-            )
+        return ast.unparse(ast.parse(expression, mode="eval"))
+    except (SyntaxError, ValueError, RecursionError):
+        return None
+
+
+def _numeric_nodes(problem: str) -> Optional[List[ast.AST]]:
+    """AST nodes of `problem` if it is a plain numeric expression, else None."""
+    try:
+        tree = ast.parse(problem.strip(), mode="eval")
+    except SyntaxError:
+        return None
+    nodes = list(ast.walk(tree))
+    for node in nodes:
+        if not isinstance(node, _FAST_PATH_NODES):
+            return None
+        if isinstance(node, ast.Name) and node.id not in _FAST_PATH_NAMES:
+            return None
+        if isinstance(node, ast.Constant) and (
+            isinstance(node.value, bool) or not isinstance(node.value, (int, float))
+        ):
+            return None
+    return nodes
+
+
+def _is_numeric_expression(problem: str) -> bool:
+    """True if `problem` is already a numeric expression like "37593 * 67"."""
+    return _numeric_nodes(problem) is not None
+
+
+def _numexpr_evaluate(expression: str) -> str:
+    # numexpr keeps its own cache of compiled programs keyed on the expression text
+    local_dict = {"pi": math.pi, "e": math.e}
+    output = str(
+        numexpr.evaluate(
+            expression,
+            global_dict={},  # restrict access to globals
+            local_dict=local_dict,  # add common mathematical functions
         )
+    )
+    # Remove any leading and trailing brackets from the output
+    return re.sub(r"^\[|\]$", "", output)
+
+
+MATH_EVAL_WORKERS = int(os.getenv("MATH_EVAL_WORKERS", "2"))
+MATH_EVAL_TIMEOUT = float(os.getenv("MATH_EVAL_TIMEOUT", "2.0"))
+MATH_EVAL_MAX_MEMORY_MB = int(os.getenv("MATH_EVAL_MAX_MEMORY_MB", "512"))
+# How long a call waits for a free worker before giving up
+MATH_EVAL_QUEUE_TIMEOUT = float(os.getenv("MATH_EVAL_QUEUE_TIMEOUT", "10.0"))
+
+
+def _limit_memory(max_memory: int) -> None:
+    """Cap how much address space this process may add on top of what it has."""
+    try:
+        import resource
+
+        with open("/proc/self/statm") as statm:
+            current = int(statm.read().split()[0]) * resource.getpagesize()
+        limit = current + max_memory
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, OSError, ValueError):
+        # Not Linux: run without a cap rather than not at all
+        pass
+
+
+def _evaluation_worker(conn, max_memory: int) -> None:
+    _limit_memory(max_memory)
+    while True:
+        try:
+            expression = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        try:
+            conn.send((True, _numexpr_evaluate(expression)))
+        except Exception as e:
+            try:
+                conn.send((False, e))
+            except Exception:
+                # The exception itself could not be pickled
+                conn.send((False, RuntimeError(repr(e))))
+
+
+class _EvaluationPool:
+    """Warm worker processes that evaluate expressions under a time and memory cap.
+
+    Every expression runs in one of `size` long-lived processes, so a
+    pathological expression (huge powers, giant broadcasts) can neither pin
+    the calling thread nor take the memory of the whole app with it. A worker
+    that runs past `timeout` seconds is killed and replaced.
+
+    Workers come from a forkserver (spawn where there is none), never from a
+    fork of this process: the app has request and executor threads, and a
+    fork could copy a lock one of them holds. The forkserver preloads this
+    module, so starting or replacing a worker stays cheap.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        timeout: float,
+        max_memory: int,
+        queue_timeout: float = MATH_EVAL_QUEUE_TIMEOUT,
+    ):
+        self.timeout = timeout
+        self.max_memory = max_memory
+        self.queue_timeout = queue_timeout
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            self._context = multiprocessing.get_context("forkserver")
+            self._context.set_forkserver_preload([__name__])
+        else:
+            self._context = multiprocessing.get_context("spawn")
+        self._idle: queue.Queue = queue.Queue()
+        for _ in range(size):
+            self._idle.put(self._start_worker())
+
+    def _start_worker(self):
+        parent, child = self._context.Pipe()
+        process = self._context.Process(
+            target=_evaluation_worker, args=(child, self.max_memory), daemon=True
+        )
+        process.start()
+        child.close()
+        return process, parent
+
+    def _replace(self, worker) -> None:
+        process, conn = worker
+        process.kill()
+        process.join()
+        conn.close()
+        self._idle.put(self._start_worker())
+
+    def evaluate(self, expression: str) -> str:
+        try:
+            worker = self._idle.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            raise TimeoutError(
+                f"No evaluation worker was free within {self.queue_timeout} seconds"
+            )
+        process, conn = worker
+        try:
+            conn.send(expression)
+            finished = conn.poll(self.timeout)
+            if finished:
+                ok, payload = conn.recv()
+        except (EOFError, OSError):
+            # The worker died, most likely by hitting its memory cap
+            self._replace(worker)
+            raise MemoryError("Evaluation worker exited unexpectedly")
+        if not finished:
+            self._replace(worker)
+            raise TimeoutError(f"Evaluation took longer than {self.timeout} seconds")
+        self._idle.put(worker)
+        if not ok:
+            raise payload
+        return payload
+
+    def close(self) -> None:
+        while not self._idle.empty():
+            process, conn = self._idle.get_nowait()
+            conn.close()
+            process.kill()
+
+
+_evaluation_pool: Optional[_EvaluationPool] = None
+_evaluation_pool_lock = threading.Lock()
+
+
+def get_evaluation_pool() -> Optional[_EvaluationPool]:
+    """The process-wide evaluation pool, started by the first call.
+
+    Apps should call this once at startup, so no request pays for starting
+    the workers. Returns None when MATH_EVAL_WORKERS is 0, in which case
+    expressions are evaluated in the calling thread without a time or
+    memory cap.
+    """
+    global _evaluation_pool
+    if MATH_EVAL_WORKERS <= 0:
+        return None
+    with _evaluation_pool_lock:
+        if _evaluation_pool is None:
+            _evaluation_pool = _EvaluationPool(
+                MATH_EVAL_WORKERS,
+                MATH_EVAL_TIMEOUT,
+                MATH_EVAL_MAX_MEMORY_MB * 1024 * 1024,
+            )
+            atexit.register(_evaluation_pool.close)
+    return _evaluation_pool
+
+
+def _is_bounded(expression: str) -> bool:
+    """True for literal arithmetic without powers, which is always cheap."""
+    nodes = _numeric_nodes(expression)
+    return nodes is not None and not any(isinstance(n, ast.Pow) for n in nodes)
+
+
+_RESULT_CACHE_SIZE = 1024
+_RESULTS: "OrderedDict[str, str]" = OrderedDict()
+_RESULTS_LOCK = threading.Lock()
+
+
+def _evaluate_uncached(expression: str) -> str:
+    pool = get_evaluation_pool()
+    if pool is None or _is_bounded(expression):
+        return _numexpr_evaluate(expression)
+    return pool.evaluate(expression)
+
+
+def _evaluate_cached(expression: str) -> str:
+    key = _expression_key(expression)
+    if key is None:
+        return _evaluate_uncached(expression)
+    with _RESULTS_LOCK:
+        result = _RESULTS.get(key)
+        if result is not None:
+            _RESULTS.move_to_end(key)
+            return result
+    result = _evaluate_uncached(expression)
+    with _RESULTS_LOCK:
+        _RESULTS[key] = result
+        if len(_RESULTS) > _RESULT_CACHE_SIZE:
+            _RESULTS.popitem(last=False)
+    return result
+
+
+def _evaluate_expression(expression: str) -> str:
+    try:
+        return _evaluate_cached(expression.strip())
     except Exception as e:
         raise ValueError(
             f'Failed to evaluate "{expression}". Raised error: {repr(e)}.'
             " Please try again with a valid numerical expression"
         )
 
-    # Remove any leading and trailing brackets from the output
-    return re.sub(r"^\[|\]$", "", output)
+
+# Operators whose results on int64/float64 arrays match Python's own arithmetic
+# on the literals; "**" and "%" are left to the scalar path
+_BATCH_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.UAdd, ast.USub)
+# Beyond this, int64 may overflow and float64 stops representing ints exactly
+_EXACT_LIMIT = 2.0**53
+
+
+def _expression_structure(expression: str, nodes: List[ast.AST]):
+    """Group key and literal values of a numeric expression.
+
+    The key is the expression with its literals replaced by variables, e.g.
+    "2 * 3" -> "_c0*_c1". Returns (None, None) if the expression should be
+    evaluated on its own.
+    """
+    text = expression.strip()
+    # Node offsets are in bytes and per line
+    if not text.isascii() or "\n" in text:
+        return None, None
+    constants = []
+    for node in nodes:
+        if isinstance(node, (ast.operator, ast.unaryop)):
+            if not isinstance(node, _BATCH_OPS):
+                return None, None
+        elif isinstance(node, ast.Constant):
+            constants.append(node)
+    constants.sort(key=lambda node: node.col_offset)
+    pieces = []
+    cursor = 0
+    for i, node in enumerate(constants):
+        pieces.append(text[cursor : node.col_offset])
+        pieces.append(f"_c{i}")
+        cursor = node.end_col_offset
+    pieces.append(text[cursor:])
+    template = _expression_key("".join(pieces))
+    if template is None:
+        return None, None
+    values = [node.value for node in constants]
+    # Python evaluates a literal-only expression in floats as soon as one
+    # literal is a float or there is a division; otherwise in exact ints
+    kinds = tuple("d" if isinstance(value, float) else "l" for value in values)
+    return (template, kinds), values
+
+
+def _evaluate_group(template: str, kinds, rows: List[list]) -> List[Optional[str]]:
+    """Evaluate one template over many rows of constants.
+
+    Returns None for rows whose result could not be represented exactly, so
+    they can fall back to the scalar path.
+    """
+    floats = "d" in kinds or "/" in template
+    local_dict = {"pi": math.pi, "e": math.e}
+    for i in range(len(kinds)):
+        local_dict[f"_c{i}"] = np.array(
+            [row[i] for row in rows], dtype=np.float64 if floats else np.int64
+        )
+    checked = numexpr.evaluate(
+        template,
+        global_dict={},
+        local_dict={
+            name: value.astype(np.float64) if isinstance(value, np.ndarray) else value
+            for name, value in local_dict.items()
+        },
+    )
+    output = numexpr.evaluate(template, global_dict={}, local_dict=local_dict)
+    output = np.broadcast_to(output, (len(rows),))
+    checked = np.broadcast_to(checked, (len(rows),))
+    exact = [
+        all(abs(value) < _EXACT_LIMIT for value in row)
+        and abs(check) < _EXACT_LIMIT
+        # Python's int products have no sign of zero, float ones do
+        and not (floats and check == 0)
+        for row, check in zip(rows, checked)
+    ]
+    return [str(value) if ok else None for value, ok in zip(output, exact)]
+
+
+def _evaluate_expressions(expressions: List[str]) -> List[str]:
+    """Evaluate many expressions, in order, sharing work where possible.
+
+    Numeric expressions with the same structure, like "3 * 4" and "5 * 6",
+    are evaluated together as a single numexpr array evaluation. Anything
+    else, or a group that fails as a whole, is evaluated one by one. Failures
+    are returned as the repr of the ValueError the math tool returns.
+    """
+    results: List[Optional[str]] = [None] * len(expressions)
+    groups: Dict[tuple, List[int]] = {}
+    rows: Dict[int, list] = {}
+    for i, expression in enumerate(expressions):
+        nodes = _numeric_nodes(expression)
+        if nodes is not None:
+            structure, values = _expression_structure(expression, nodes)
+            if structure is not None:
+                rows[i] = values
+                groups.setdefault(structure, []).append(i)
+
+    for (template, kinds), members in groups.items():
+        if len(members) == 1:
+            continue
+        try:
+            outputs = _evaluate_group(template, kinds, [rows[i] for i in members])
+        except Exception:
+            continue
+        for i, output in zip(members, outputs):
+            results[i] = output
+
+    for i, expression in enumerate(expressions):
+        if results[i] is None:
+            try:
+                results[i] = _evaluate_expression(expression)
+            except Exception as e:
+                results[i] = repr(e)
+    return results
+
+
+class _LatencyStats:
+    """Call counts and latencies of the math tool, per evaluation path."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def record(self, path: str, seconds: float) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(
+                path, {"calls": 0, "total_s": 0.0, "max_s": 0.0}
+            )
+            stats["calls"] += 1
+            stats["total_s"] += seconds
+            stats["max_s"] = max(stats["max_s"], seconds)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                path: dict(stats, mean_s=stats["total_s"] / stats["calls"])
+                for path, stats in self._stats.items()
+            }
+
+
+_latency_stats = _LatencyStats()
+
+
+def get_math_latency_stats() -> Dict[str, Dict[str, float]]:
+    """Latency of math tool calls, split into the "llm", "fast" and "batch" paths."""
+    return _latency_stats.summary()
+
+
+class MathTool(StructuredTool):
+    """The math tool, plus `batch_solve`, which shares work across problems.
+
+    `batch` keeps the Runnable contract (tool calls, callbacks, per-input
+    configs, `return_exceptions`); `batch_solve` is the vectorized path for
+    callers that hold plain problems and can skip per-call tool callbacks.
+    """
+
+    batch_func: Callable[..., List[str]]
+
+    def batch_solve(
+        self,
+        inputs: List[Union[str, Dict[str, Any]]],
+        config: Optional[RunnableConfig] = None,
+    ) -> List[str]:
+        """Solve problems given as strings or {"problem": ..., "context": ...} dicts."""
+        problems = []
+        contexts = []
+        for tool_input in inputs:
+            if isinstance(tool_input, str):
+                tool_input = {"problem": tool_input}
+            problems.append(tool_input["problem"])
+            contexts.append(tool_input.get("context"))
+        return self.batch_func(problems, contexts, config)
 
 
 def get_math_tool(llm: ChatOpenAI):
+    # Start the evaluation workers with the tool, not on its first expression
+    get_evaluation_pool()
     prompt = ChatPromptTemplate.from_messages(
         [
             ("system", _SYSTEM_PROMPT),
@@ -116,11 +540,7 @@ def get_math_tool(llm: ChatOpenAI):
     )
     extractor = prompt | llm.with_structured_output(ExecuteCode)
 
-    def calculate_expression(
-        problem: str,
-        context: Optional[List[str]] = None,
-        config: Optional[RunnableConfig] = None,
-    ):
+    def chain_input(problem: str, context: Optional[List[str]]) -> dict:
         chain_input = {"problem": problem}
         if context:
             context_str = "\n".join(context)
@@ -129,15 +549,67 @@ def get_math_tool(llm: ChatOpenAI):
                     context=context_str.strip()
                 )
                 chain_input["context"] = [SystemMessage(content=context_str)]
-        code_model = extractor.invoke(chain_input, config)
+        return chain_input
+
+    def calculate_expression(
+        problem: str,
+        context: Optional[List[str]] = None,
+        config: Optional[RunnableConfig] = None,
+    ):
+        start = time.perf_counter()
+        if _is_numeric_expression(problem):
+            # No need for an LLM round trip to turn "1 + 3" into code
+            try:
+                return _evaluate_expression(problem)
+            except Exception as e:
+                return repr(e)
+            finally:
+                _latency_stats.record("fast", time.perf_counter() - start)
+
+        code_model = extractor.invoke(chain_input(problem, context), config)
         try:
             return _evaluate_expression(code_model.code)
         except Exception as e:
             return repr(e)
+        finally:
+            _latency_stats.record("llm", time.perf_counter() - start)
+
+    def calculate_expressions(
+        problems: List[str],
+        contexts: Optional[List[Optional[List[str]]]] = None,
+        config: Optional[RunnableConfig] = None,
+    ) -> List[str]:
+        """Solve many problems with at most one extractor.batch call."""
+        start = time.perf_counter()
+        contexts = contexts or [None] * len(problems)
+        expressions = list(problems)
+        errors: Dict[int, str] = {}
+        needs_llm = [
+            i for i, problem in enumerate(problems) if not _is_numeric_expression(problem)
+        ]
+        if needs_llm:
+            code_models = extractor.batch(
+                [chain_input(problems[i], contexts[i]) for i in needs_llm],
+                config,
+                return_exceptions=True,
+            )
+            for i, code_model in zip(needs_llm, code_models):
+                if isinstance(code_model, Exception):
+                    errors[i] = repr(code_model)
+                else:
+                    expressions[i] = code_model.code
+        evaluate = [i for i in range(len(problems)) if i not in errors]
+        results = dict(errors)
+        results.update(
+            zip(evaluate, _evaluate_expressions([expressions[i] for i in evaluate]))
+        )
+        _latency_stats.record("batch", time.perf_counter() - start)
+        return [results[i] for i in range(len(problems))]
 
-    return StructuredTool.from_function(
+    return MathTool.from_function(
         name="math",
         func=calculate_expression,
         description=_MATH_DESCRIPTION,
+        batch_func=calculate_expressions,
     )
 
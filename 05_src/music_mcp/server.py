@@ -3,14 +3,15 @@ import chromadb
 from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
 from pydantic import BaseModel, Field
 
-import sqlalchemy as sa
-import pandas as pd
 
 from dotenv import load_dotenv
 import ngrok
 import os
 
+from utils.embedding_cache import CachedEmbeddingFunction, get_embedding_cache
 from utils.logger import get_logger
+from utils.reviews_db import fetch_review_details
+from utils.vector_index import get_vector_index
 
 # Load environment variables and secrets
 load_dotenv()
@@ -23,12 +24,20 @@ _logs = get_logger(__name__)
 MCP_DOMAIN = os.getenv("MCP_DOMAIN")
 
 vector_db_client_url="http://localhost:8000"
-chroma = chromadb.HttpClient(host=vector_db_client_url)
-collection = chroma.get_collection(name="pitchfork_reviews", 
-                                   embedding_function=OpenAIEmbeddingFunction(
-                                       api_key = os.getenv("OPENAI_API_KEY"),
-                                       model_name="text-embedding-3-small")
-                                   )
+embedding_model = "text-embedding-3-small"
+embedding_function = OpenAIEmbeddingFunction(
+    api_key = os.getenv("OPENAI_API_KEY"),
+    model_name=embedding_model)
+# Same cache directory as course_chat, so either process can reuse the other's query embeddings
+query_embedder = CachedEmbeddingFunction(embedding_function, get_embedding_cache(embedding_model))
+if os.getenv("VECTOR_BACKEND", "chroma").lower() == "mmap":
+    # An in-process copy of the collection, exported with python -m utils.vector_index
+    collection = get_vector_index(os.getenv("VECTOR_INDEX_DIR", "./cache/pitchfork_reviews/"))
+else:
+    chroma = chromadb.HttpClient(host=vector_db_client_url)
+    collection = chroma.get_collection(name="pitchfork_reviews", 
+                                       embedding_function=embedding_function
+                                       )
 
 # Initialize MCP Server
 mcp = FastMCP(
@@ -61,47 +70,21 @@ def recommend_albums(query: str, n_results: int = 1) -> list[MusicReviewData]:
 
 def additional_details(review_id:str):
     _logs.debug(f'Fetching additional details for review ID: {review_id}')
-    engine = sa.create_engine(os.getenv("SQL_URL"))
-    query = f"""
-    SELECT r.reviewid,
-		r.title,
-		r.artist,
-		r.score,
-		g.genre
-    FROM reviews AS r
-    LEFT JOIN genres as g
-	    ON r.reviewid = g.reviewid
-    WHERE r.reviewid = '{review_id}'
-    """
-    with engine.connect() as conn:
-        result = pd.read_sql(query, conn)
-    if not result.empty:
-        row = result.iloc[0]
-        details = {
-            "reviewid": row['reviewid'],
-            "album": row['title'],
-            "score": row['score'],
-            "artist": row['artist']
-        }
-        return details
-    else:
-        _logs.warning(f'No details found for review ID: {review_id}')
-        return {}
+    return fetch_review_details([review_id])[0]
     
 def get_reviewid_from_custom_id(custom_id:str):
     return custom_id.split('_')[0]
 
 def get_context_data(query:str, collection:chromadb.api.models.Collection, top_n:int):
     results = collection.query(
-        query_texts=[query],
+        query_embeddings=query_embedder([query]),
         n_results=top_n
     )
-    context_data = []
-    for idx, custom_id in enumerate(results['ids'][0]):
-        review_id = get_reviewid_from_custom_id(custom_id)
-        details = additional_details(review_id)
-        details['text'] = results['documents'][0][idx]
-        context_data.append(details)
+    review_ids = [get_reviewid_from_custom_id(custom_id) for custom_id in results['ids'][0]]
+    # One query for every hit, in hit order
+    context_data = fetch_review_details(review_ids)
+    for details, text in zip(context_data, results['documents'][0]):
+        details['text'] = text
     return context_data
 
 def get_context(query:str, collection:chromadb.api.models.Collection, top_n:int):
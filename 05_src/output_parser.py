@@ -2,11 +2,17 @@
 
 import ast
 import re
+import threading
+from collections import OrderedDict
+from functools import cached_property
 from typing import (
     Any,
+    AsyncIterator,
     Dict,
+    Iterable,
     Iterator,
     List,
+    Mapping,
     Optional,
     Sequence,
     Tuple,
@@ -26,6 +32,10 @@ ACTION_PATTERN = r"\n*(\d+)\. (\w+)\((.*)\)(\s*#\w+\n)?"
 ID_PATTERN = r"\$\{?(\d+)\}?"
 END_OF_PLAN = "<END_OF_PLAN>"
 
+_THOUGHT_REGEX = re.compile(THOUGHT_PATTERN)
+_ACTION_REGEX = re.compile(ACTION_PATTERN)
+_ID_REGEX = re.compile(ID_PATTERN)
+
 
 ### Helper functions
 
@@ -37,35 +47,109 @@ def _ast_parse(arg: str) -> Any:
         return arg
 
 
+_KWARG_REGEX = re.compile(r"\s*([A-Za-z_]\w*)\s*=(?!=)")
+_OPEN_BRACKETS = "([{"
+_CLOSE_BRACKETS = ")]}"
+_QUOTES = "'\""
+# Only quotes, brackets and commas can change the shape of an argument list
+_CALL_TOKEN_REGEX = re.compile(r"\"\"\"|'''|[\"'()\[\]{},]")
+_STRING_END_REGEX = {
+    quote: re.compile(r"(?:[^\\]|\\.)*?" + re.escape(quote), re.DOTALL)
+    for quote in ('"""', "'''", '"', "'")
+}
+
+# args schema class -> argument names, for the most recently used schemas.
+# Tools are built per request, but they share a handful of schema classes.
+_SIGNATURE_CACHE_SIZE = 256
+_SCHEMA_SIGNATURES: "OrderedDict[type, Tuple[str, ...]]" = OrderedDict()
+_SCHEMA_SIGNATURES_LOCK = threading.Lock()
+
+
+def _tool_signature(tool: BaseTool) -> Tuple[str, ...]:
+    """Argument names of a tool, in declaration order."""
+    schema = tool.args_schema
+    if not isinstance(schema, type):
+        return tuple(tool.args.keys())
+    with _SCHEMA_SIGNATURES_LOCK:
+        signature = _SCHEMA_SIGNATURES.get(schema)
+        if signature is not None:
+            _SCHEMA_SIGNATURES.move_to_end(schema)
+            return signature
+    # Building the JSON schema is the slow part of parsing wide calls
+    signature = tuple(tool.args.keys())
+    with _SCHEMA_SIGNATURES_LOCK:
+        _SCHEMA_SIGNATURES[schema] = signature
+        if len(_SCHEMA_SIGNATURES) > _SIGNATURE_CACHE_SIZE:
+            _SCHEMA_SIGNATURES.popitem(last=False)
+    return signature
+
+
+def _split_call_args(args: str) -> List[str]:
+    """Split a call's argument string on top-level commas in a single pass.
+
+    Commas inside string literals or nested brackets do not split, and an
+    unmatched closing parenthesis ends the argument list.
+    """
+    segments = []
+    depth = 0
+    start = 0
+    i = 0
+    n = len(args)
+    while match := _CALL_TOKEN_REGEX.search(args, i):
+        token = match.group(0)
+        i = match.end()
+        if token[0] in _QUOTES:
+            # Jump to the matching close quote, honouring escapes
+            end = _STRING_END_REGEX[token].match(args, i)
+            i = end.end() if end else n
+        elif token in _OPEN_BRACKETS:
+            depth += 1
+        elif token in _CLOSE_BRACKETS:
+            if depth == 0:
+                n = match.start()
+                break
+            depth -= 1
+        elif depth == 0:
+            segments.append(args[start : match.start()])
+            start = i
+    segments.append(args[start:n])
+    return [segment for segment in segments if segment.strip()]
+
+
 def _parse_llm_compiler_action_args(args: str, tool: Union[str, BaseTool]) -> list[Any]:
-    """Parse arguments from a string."""
+    """Parse arguments from a string.
+
+    Supports positional and keyword arguments, in the usual Python order, with
+    values given as (possibly nested) literals. Values that are not literals,
+    like a bare `$1`, are passed through as strings.
+    """
     if args == "":
         return ()
     if isinstance(tool, str):
         return ()
+    signature = _tool_signature(tool)
+    names = set(signature)
     extracted_args = {}
-    tool_key = None
-    prev_idx = None
-    for key in tool.args.keys():
-        # Split if present
-        if f"{key}=" in args:
-            idx = args.index(f"{key}=")
-            if prev_idx is not None:
-                extracted_args[tool_key] = _ast_parse(
-                    args[prev_idx:idx].strip().rstrip(",")
+    for position, segment in enumerate(_split_call_args(args)):
+        if match := _KWARG_REGEX.match(segment):
+            key = match.group(1)
+            if key not in names:
+                raise OutputParserException(
+                    f"Tool {tool.name} has no argument {key!r}; expected one of {signature}."
                 )
-            args = args.split(f"{key}=", 1)[1]
-            tool_key = key
-            prev_idx = 0
-    if prev_idx is not None:
-        extracted_args[tool_key] = _ast_parse(
-            args[prev_idx:].strip().rstrip(",").rstrip(")")
-        )
+            value = segment[match.end() :]
+        elif position < len(signature):
+            key = signature[position]
+            value = segment
+        else:
+            # Extra positional arguments have nowhere to go
+            continue
+        extracted_args[key] = _ast_parse(value.strip())
     return extracted_args
 
 
 def default_dependency_rule(idx, args: str):
-    matches = re.findall(ID_PATTERN, args)
+    matches = _ID_REGEX.findall(args)
     numbers = [int(match) for match in matches]
     return idx in numbers
 
@@ -76,7 +160,9 @@ def _get_dependencies_from_graph(
     """Get dependencies from a graph."""
     if tool_name == "join":
         return list(range(1, idx))
-    return [i for i in range(1, idx) if default_dependency_rule(i, str(args))]
+    # Extract the placeholders once rather than re-scanning for every earlier index
+    referenced = {int(match) for match in _ID_REGEX.findall(str(args))}
+    return sorted(i for i in referenced if 0 < i < idx)
 
 
 class Task(TypedDict):
@@ -87,8 +173,85 @@ class Task(TypedDict):
     thought: Optional[str]
 
 
+class PlanGraph:
+    """Dependency graph of a plan, filled in as its tasks stream in.
+
+    Dependencies are read from each task once, when it is added. The graph
+    keeps the topological level of every task, the critical path length and
+    the set of tasks that are ready to run, so schedulers can query them
+    without rescanning the plan.
+    """
+
+    def __init__(self, completed: Iterable[int] = ()):
+        self.tasks: Dict[int, Task] = {}
+        # idx -> 1 + level of its deepest dependency inside this plan
+        self.levels: Dict[int, int] = {}
+        self.critical_path_length = 0
+        # Tasks whose dependencies have all completed and that nobody took yet
+        self.ready: Dict[int, Task] = {}
+        self.completed = set(completed)
+        self._missing: Dict[int, set] = {}
+        self._dependents: Dict[int, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.tasks)
+
+    def add(self, task: Task) -> None:
+        idx = task["idx"]
+        self.tasks[idx] = task
+        deps = task["dependencies"]
+        level = 1 + max((self.levels.get(dep, 0) for dep in deps), default=0)
+        self.levels[idx] = level
+        self.critical_path_length = max(self.critical_path_length, level)
+
+        missing = {dep for dep in deps if dep not in self.completed}
+        if not missing:
+            self.ready[idx] = task
+            return
+        self._missing[idx] = missing
+        for dep in missing:
+            self._dependents.setdefault(dep, []).append(idx)
+
+    def complete(self, idx: int) -> None:
+        """Mark a task as done and promote the tasks it unblocks to ready."""
+        self.completed.add(idx)
+        for dependent in self._dependents.pop(idx, []):
+            missing = self._missing.get(dependent)
+            if missing is None:
+                continue
+            missing.discard(idx)
+            if not missing:
+                del self._missing[dependent]
+                self.ready[dependent] = self.tasks[dependent]
+
+    def take_ready(self) -> List[Task]:
+        """Claim every ready task, in the order they became ready."""
+        ready = list(self.ready.values())
+        self.ready.clear()
+        return ready
+
+    def take_stranded(self) -> List[Task]:
+        """Claim the tasks waiting on dependencies that were never emitted."""
+        stranded = [self.tasks[idx] for idx in sorted(self._missing)]
+        self._missing.clear()
+        self._dependents.clear()
+        return stranded
+
+    def topological_levels(self) -> List[List[int]]:
+        """Task indices grouped by level; tasks in a level can run in parallel."""
+        grouped: List[List[int]] = [[] for _ in range(self.critical_path_length)]
+        for idx, level in self.levels.items():
+            grouped[level - 1].append(idx)
+        return grouped
+
+
+def _index_tools(tools: Sequence[BaseTool]) -> Dict[str, BaseTool]:
+    # First tool wins on duplicate names, as with a list lookup
+    return {tool.name: tool for tool in reversed(tools)}
+
+
 def instantiate_task(
-    tools: Sequence[BaseTool],
+    tools: Union[Sequence[BaseTool], Mapping[str, BaseTool]],
     idx: int,
     tool_name: str,
     args: Union[str, Any],
@@ -97,9 +260,11 @@ def instantiate_task(
     if tool_name == "join":
         tool = "join"
     else:
+        if not isinstance(tools, Mapping):
+            tools = _index_tools(tools)
         try:
-            tool = tools[[tool.name for tool in tools].index(tool_name)]
-        except ValueError as e:
+            tool = tools[tool_name]
+        except KeyError as e:
             raise OutputParserException(f"Tool {tool_name} not found.") from e
     tool_args = _parse_llm_compiler_action_args(args, tool)
     dependencies = _get_dependencies_from_graph(idx, tool_name, tool_args)
@@ -118,15 +283,37 @@ class LLMCompilerPlanParser(BaseTransformOutputParser[dict], extra="allow"):
 
     tools: List[BaseTool]
 
+    @cached_property
+    def tools_by_name(self) -> Dict[str, BaseTool]:
+        return _index_tools(self.tools)
+
     def _transform(self, input: Iterator[Union[str, BaseMessage]]) -> Iterator[Task]:
         texts = []
-        # TODO: Cleanup tuple state tracking here.
         thought = None
         for chunk in input:
             # Assume input is str. TODO: support vision/other formats
             text = chunk if isinstance(chunk, str) else str(chunk.content)
             for task, thought in self.ingest_token(text, texts, thought):
+                if task:
+                    yield task
+        # Final possible task
+        if texts:
+            task, _ = self._parse_task("".join(texts), thought)
+            if task:
                 yield task
+
+    async def _atransform(
+        self, input: AsyncIterator[Union[str, BaseMessage]]
+    ) -> AsyncIterator[Task]:
+        # Same scanner as _transform; each stream keeps its own buffer, so many
+        # plans can be parsed concurrently on one event loop
+        texts = []
+        thought = None
+        async for chunk in input:
+            text = chunk if isinstance(chunk, str) else str(chunk.content)
+            for task, thought in self.ingest_token(text, texts, thought):
+                if task:
+                    yield task
         # Final possible task
         if texts:
             task, _ = self._parse_task("".join(texts), thought)
@@ -144,31 +331,53 @@ class LLMCompilerPlanParser(BaseTransformOutputParser[dict], extra="allow"):
     ) -> Iterator[Task]:
         yield from self.transform([input], config, **kwargs)
 
+    async def astream(
+        self,
+        input: str | BaseMessage,
+        config: RunnableConfig | None = None,
+        **kwargs: Any | None,
+    ) -> AsyncIterator[Task]:
+        async def input_aiter() -> AsyncIterator[str | BaseMessage]:
+            yield input
+
+        async for task in self.atransform(input_aiter(), config, **kwargs):
+            yield task
+
     def ingest_token(
         self, token: str, buffer: List[str], thought: Optional[str]
     ) -> Iterator[Tuple[Optional[Task], str]]:
-        buffer.append(token)
-        if "\n" in token:
-            buffer_ = "".join(buffer).split("\n")
-            suffix = buffer_[-1]
-            for line in buffer_[:-1]:
-                task, thought = self._parse_task(line, thought)
-                if task:
-                    yield task, thought
-            buffer.clear()
-            buffer.append(suffix)
+        """Scan a streamed token for complete lines.
+
+        `buffer` only ever holds the fragments of the current, unterminated
+        line, and each character of the token is visited once, so streaming a
+        plan costs time linear in its length. Thought lines are yielded as
+        `(None, thought)` so the caller keeps the thought across tokens.
+        """
+        cursor = 0
+        while (newline := token.find("\n", cursor)) != -1:
+            if buffer:
+                buffer.append(token[cursor:newline])
+                line = "".join(buffer)
+                buffer.clear()
+            else:
+                line = token[cursor:newline]
+            task, thought = self._parse_task(line, thought)
+            yield task, thought
+            cursor = newline + 1
+        if cursor < len(token):
+            buffer.append(token[cursor:])
 
     def _parse_task(self, line: str, thought: Optional[str] = None):
         task = None
-        if match := re.match(THOUGHT_PATTERN, line):
+        if match := _THOUGHT_REGEX.match(line):
             # Optionally, action can be preceded by a thought
             thought = match.group(1)
-        elif match := re.match(ACTION_PATTERN, line):
+        elif match := _ACTION_REGEX.match(line):
             # if action is parsed, return the task, and clear the buffer
             idx, tool_name, args, _ = match.groups()
             idx = int(idx)
             task = instantiate_task(
-                tools=self.tools,
+                tools=self.tools_by_name,
                 idx=idx,
                 tool_name=tool_name,
                 args=args,
@@ -0,0 +1,399 @@
+## Task Executor
+
+import asyncio
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    AsyncIterable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from langchain_core.messages import FunctionMessage
+from langchain_core.runnables import RunnableConfig
+from typing_extensions import TypedDict
+
+from output_parser import ID_PATTERN, PlanGraph, Task
+
+_ID_REGEX = re.compile(ID_PATTERN)
+
+
+class TaskResult(TypedDict):
+    idx: int
+    name: str
+    args: Any
+    observation: Any
+    # True when the observation was served from a ResultMemo
+    cached: bool
+    dependencies: List[int]
+    started: float
+    finished: float
+    duration: float
+
+
+### Helper functions
+
+
+def _task_name(task: Task) -> str:
+    tool = task["tool"]
+    return tool if isinstance(tool, str) else tool.name
+
+
+def _resolve_arg(arg: Union[str, Any], observations: Dict[int, Any]):
+    """Substitute `$N` / `${N}` placeholders with the output of task N."""
+
+    def replace_match(match):
+        # Unknown indices are left untouched so the tool sees the placeholder
+        idx = int(match.group(1))
+        return str(observations.get(idx, match.group(0)))
+
+    if isinstance(arg, str):
+        return _ID_REGEX.sub(replace_match, arg)
+    elif isinstance(arg, list):
+        return [_resolve_arg(a, observations) for a in arg]
+    else:
+        return arg
+
+
+def _resolve_args(args: Any, observations: Dict[int, Any]) -> Any:
+    if isinstance(args, str):
+        return _resolve_arg(args, observations)
+    elif isinstance(args, dict):
+        return {key: _resolve_arg(val, observations) for key, val in args.items()}
+    # This will likely fail
+    return args
+
+
+def _execute_task(
+    task: Task,
+    observations: Dict[int, Any],
+    config: Optional[RunnableConfig],
+    memo: Optional["ResultMemo"] = None,
+) -> Tuple[Any, bool]:
+    """Run a task. Returns the observation and whether it came from the memo."""
+    tool_to_use = task["tool"]
+    if isinstance(tool_to_use, str):
+        return tool_to_use, False
+    args = task["args"]
+    try:
+        resolved_args = _resolve_args(args, observations)
+    except Exception as e:
+        return (
+            f"ERROR(Failed to call {tool_to_use.name} with args {args}.)"
+            f" Args could not be resolved. Error: {repr(e)}"
+        ), False
+    key = None
+    if memo is not None:
+        key = memo.key(tool_to_use.name, resolved_args, config)
+    if key is not None:
+        hit, observation = memo.get(key)
+        if hit:
+            return observation, True
+    try:
+        observation = tool_to_use.invoke(resolved_args, config)
+    except Exception as e:
+        return (
+            f"ERROR(Failed to call {tool_to_use.name} with args {args}."
+            + f" Args resolved to {resolved_args}. Error: {repr(e)})"
+        ), False
+    if key is not None:
+        memo.put(key, observation)
+    return observation, False
+
+
+async def _aexecute_task(
+    task: Task,
+    observations: Dict[int, Any],
+    config: Optional[RunnableConfig],
+    memo: Optional["ResultMemo"] = None,
+) -> Tuple[Any, bool]:
+    tool_to_use = task["tool"]
+    if isinstance(tool_to_use, str):
+        return tool_to_use, False
+    args = task["args"]
+    try:
+        resolved_args = _resolve_args(args, observations)
+    except Exception as e:
+        return (
+            f"ERROR(Failed to call {tool_to_use.name} with args {args}.)"
+            f" Args could not be resolved. Error: {repr(e)}"
+        ), False
+    key = None
+    if memo is not None:
+        key = memo.key(tool_to_use.name, resolved_args, config)
+    if key is not None:
+        hit, observation = memo.get(key)
+        if hit:
+            return observation, True
+    try:
+        observation = await tool_to_use.ainvoke(resolved_args, config)
+    except Exception as e:
+        return (
+            f"ERROR(Failed to call {tool_to_use.name} with args {args}."
+            + f" Args resolved to {resolved_args}. Error: {repr(e)})"
+        ), False
+    if key is not None:
+        memo.put(key, observation)
+    return observation, False
+
+
+def results_to_messages(results: Dict[int, TaskResult]) -> List[FunctionMessage]:
+    """Convert task results into the FunctionMessages expected by the joiner."""
+    return [
+        FunctionMessage(
+            name=result["name"],
+            content=str(result["observation"]),
+            additional_kwargs={"idx": idx, "args": result["args"]},
+            tool_call_id=idx,
+        )
+        for idx, result in sorted(results.items())
+    ]
+
+
+### Result memo
+
+
+class ResultMemo:
+    """Memo of tool results that survives replans within a conversation.
+
+    Entries are keyed on the conversation thread (`configurable.thread_id` in
+    the run config), the tool name and the resolved arguments, so a task the
+    planner re-emits after a replan completes without calling the tool again.
+    The memo is bounded by `max_size` (least recently used entries go first)
+    and entries expire after `ttl` seconds. Runs without a thread id are not
+    memoized, so conversations never see each other's results.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = 600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(
+        tool_name: str, args: Any, config: Optional[RunnableConfig] = None
+    ) -> Optional[Tuple[Any, str, str]]:
+        """Memo key of a tool call, or None when the run has no conversation thread."""
+        thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+        if thread_id is None:
+            return None
+        canonical = json.dumps(args, sort_keys=True, default=str)
+        return thread_id, tool_name, canonical
+
+    def get(self, key: Tuple[Any, str, str]) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored, value = entry
+                if self.ttl is None or time.monotonic() - stored < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: Tuple[Any, str, str], value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self, thread_id: Any = None) -> None:
+        """Forget every entry, or only those of one conversation thread."""
+        with self._lock:
+            if thread_id is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] == thread_id]:
+                del self._entries[key]
+
+
+def _timed_result(
+    task: Task, observation: Any, cached: bool, started: float, finished: float
+) -> TaskResult:
+    return TaskResult(
+        idx=task["idx"],
+        name=_task_name(task),
+        args=task["args"],
+        observation=observation,
+        cached=cached,
+        dependencies=list(task["dependencies"]),
+        started=started,
+        finished=finished,
+        duration=finished - started,
+    )
+
+
+### Executors
+
+
+class TaskExecutor:
+    """Streaming DAG executor for tasks produced by LLMCompilerPlanParser.
+
+    Tasks are consumed as the planner streams them and dispatched the moment
+    their dependencies resolve, so the wall time of a plan is bounded by its
+    critical path rather than by the number of tasks.
+    """
+
+    def __init__(self, max_workers: int = 8, memo: Optional[ResultMemo] = None):
+        self.max_workers = max_workers
+        self.memo = memo
+
+    def run(
+        self,
+        tasks: Iterable[Task],
+        observations: Optional[Dict[int, Any]] = None,
+        config: Optional[RunnableConfig] = None,
+        graph: Optional[PlanGraph] = None,
+    ) -> Dict[int, TaskResult]:
+        """Execute a task stream on a bounded thread pool.
+
+        Pass a `graph` to inspect the plan's structure (levels, critical path
+        length) once the run is over.
+        """
+        observations = dict(observations or {})
+        graph = graph if graph is not None else PlanGraph()
+        graph.completed.update(observations)
+        results: Dict[int, TaskResult] = {}
+        lock = threading.Lock()
+        idle = threading.Condition(lock)
+        in_flight = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+
+            def run_one(task: Task):
+                nonlocal in_flight
+                started = time.perf_counter()
+                try:
+                    observation, cached = _execute_task(
+                        task, observations, config, self.memo
+                    )
+                except Exception as e:
+                    observation, cached = f"ERROR({repr(e)})", False
+                finished = time.perf_counter()
+                result = _timed_result(task, observation, cached, started, finished)
+                with lock:
+                    results[task["idx"]] = result
+                    observations[task["idx"]] = observation
+                    graph.complete(task["idx"])
+                    dispatch(graph.take_ready())
+                    in_flight -= 1
+                    idle.notify_all()
+
+            def dispatch(ready: List[Task]):
+                # Caller holds the lock
+                nonlocal in_flight
+                for task in ready:
+                    in_flight += 1
+                    pool.submit(run_one, task)
+
+            for task in tasks:
+                with lock:
+                    graph.add(task)
+                    dispatch(graph.take_ready())
+
+            with lock:
+                while True:
+                    while in_flight:
+                        idle.wait()
+                    stranded = graph.take_stranded()
+                    if not stranded:
+                        break
+                    dispatch(stranded)
+
+        return dict(sorted(results.items()))
+
+    async def arun(
+        self,
+        tasks: Union[Iterable[Task], AsyncIterable[Task]],
+        observations: Optional[Dict[int, Any]] = None,
+        config: Optional[RunnableConfig] = None,
+        graph: Optional[PlanGraph] = None,
+    ) -> Dict[int, TaskResult]:
+        """Execute a task stream on the running event loop.
+
+        Prefer an async task stream such as `parser.astream(...)`. A sync
+        iterable is advanced in a worker thread, so a planner that blocks
+        between tasks does not stall the loop.
+        """
+        observations = dict(observations or {})
+        graph = graph if graph is not None else PlanGraph()
+        graph.completed.update(observations)
+        results: Dict[int, TaskResult] = {}
+        semaphore = asyncio.Semaphore(self.max_workers)
+        running: set = set()
+
+        async def run_one(task: Task):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    observation, cached = await _aexecute_task(
+                        task, observations, config, self.memo
+                    )
+                except Exception as e:
+                    observation, cached = f"ERROR({repr(e)})", False
+                finished = time.perf_counter()
+                result = _timed_result(task, observation, cached, started, finished)
+            results[task["idx"]] = result
+            observations[task["idx"]] = observation
+            graph.complete(task["idx"])
+            dispatch(graph.take_ready())
+
+        def dispatch(ready: List[Task]):
+            for task in ready:
+                future = asyncio.ensure_future(run_one(task))
+                running.add(future)
+                future.add_done_callback(running.discard)
+
+        if hasattr(tasks, "__aiter__"):
+            async for task in tasks:
+                graph.add(task)
+                dispatch(graph.take_ready())
+        else:
+            iterator = iter(tasks)
+            while (task := await asyncio.to_thread(next, iterator, None)) is not None:
+                graph.add(task)
+                dispatch(graph.take_ready())
+
+        while True:
+            while running:
+                await asyncio.gather(*list(running))
+            stranded = graph.take_stranded()
+            if not stranded:
+                break
+            dispatch(stranded)
+
+        return dict(sorted(results.items()))
+
+
+def critical_path_time(results: Dict[int, TaskResult]) -> float:
+    """Longest chain of task durations through the dependency graph.
+
+    Compare with the observed plan wall time to see how close the executor
+    gets to the lower bound set by the plan's structure.
+    """
+    finish: Dict[int, float] = {}
+    for idx, result in sorted(results.items()):
+        before = max(
+            (finish[dep] for dep in result["dependencies"] if dep in finish),
+            default=0.0,
+        )
+        finish[idx] = before + result["duration"]
+    return max(finish.values(), default=0.0)
@@ -0,0 +1,273 @@
+import atexit
+import hashlib
+import threading
+import time
+import unicodedata
+
+from dotenv import load_dotenv
+import numpy as np
+import os
+
+from utils.logger import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: one process per cache directory
+    fcntl = None
+
+load_dotenv()
+
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', './cache/embeddings/')
+# Number of embeddings kept per model; the least recently used is evicted first
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', 10000))
+
+_logs = get_logger(__name__)
+
+
+def normalize_text(text):
+    '''
+    The form of a query used as cache key: Unicode NFKC, case-folded, with runs of whitespace collapsed.
+    '''
+    return ' '.join(unicodedata.normalize('NFKC', text).casefold().split())
+
+
+def _cache_key(text):
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest().encode('ascii')
+
+
+# Slot table: a header, then one row per matrix row with the key stored in
+# that row ('' when free) and when it was last used, in ns since the epoch
+_HEADER = np.dtype([('generation', '<u8'), ('dim', '<u8')])
+_HEADER_BYTES = 64
+_SLOT = np.dtype([('key', 'S64'), ('used', '<u8')])
+
+
+class _FileLock:
+    '''
+    flock on a file kept open by this process; a forked child opens its own,
+    since a lock on an inherited descriptor would be shared with the parent.
+    '''
+    def __init__(self, path, shared = False):
+        self.path = path
+        self.shared = shared
+        self._file = None
+        self._pid = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            if self._pid != os.getpid():
+                self._file = open(self.path, 'a')
+                self._pid = os.getpid()
+            fcntl.flock(self._file, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+
+
+class EmbeddingCache:
+    '''
+    Disk-backed LRU cache of embeddings for one model.
+
+    Vectors live in a memory-mapped float32 matrix of `capacity` rows
+    ({model}.{capacity}.f32). A memory-mapped slot table
+    ({model}.{capacity}.slots) holds, for each row, the key of the text
+    stored there and when it was last used, and a generation that every
+    put increments. A put writes and flushes its vectors before their keys,
+    under an exclusive file lock; reads take a shared one and check the key
+    stored with a row before returning its vector, so the chat apps and the
+    MCP server can share one directory. A process rescans the slot table
+    only when another process has put since its last look.
+    '''
+    def __init__(self, model, cache_dir = EMBEDDING_CACHE_DIR, capacity = EMBEDDING_CACHE_SIZE):
+        self.model = model
+        self.capacity = capacity
+        os.makedirs(cache_dir, exist_ok=True)
+        base = os.path.join(cache_dir, model.replace('/', '_').replace(':', '_'))
+        self._matrix_path = f'{base}.{capacity}.f32'
+        self._table_path = f'{base}.{capacity}.slots'
+        lock_path = base + '.lock'
+        self._write_lock = _FileLock(lock_path)
+        self._read_lock = _FileLock(lock_path, shared=True)
+        self._lock = threading.Lock()
+        self._header = None
+        self._table = None
+        self._matrix = None
+        self._dim = None
+        self._generation = None
+        # key -> row, and the free rows, lowest last
+        self._slots = {}
+        self._free = []
+        self.hits = 0
+        self.misses = 0
+
+    def _attach(self, create = False):
+        '''
+        Map the slot table, creating it when create is set; False if there is none yet.
+        '''
+        if self._table is not None:
+            return True
+        if not os.path.exists(self._table_path):
+            if not create:
+                return False
+            # Fully sized before it appears, so no process maps a short file
+            tmp_path = f'{self._table_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.truncate(_HEADER_BYTES + self.capacity * _SLOT.itemsize)
+            os.replace(tmp_path, self._table_path)
+        self._header = np.memmap(self._table_path, dtype=_HEADER, mode='r+', shape=(1,))
+        self._table = np.memmap(
+            self._table_path, dtype=_SLOT, mode='r+', offset=_HEADER_BYTES, shape=(self.capacity,))
+        return True
+
+    def _sync(self):
+        '''
+        Rebuild the key -> row map if another process has put since we last looked.
+        '''
+        generation = int(self._header['generation'][0])
+        if generation == self._generation:
+            return
+        keys = self._table['key'].tolist()
+        self._slots = {key: slot for slot, key in enumerate(keys) if key}
+        self._free = [slot for slot, key in enumerate(keys) if not key][::-1]
+        dim = int(self._header['dim'][0])
+        if dim and self._matrix is None:
+            self._matrix = np.memmap(
+                self._matrix_path, dtype=np.float32, mode='r+', shape=(self.capacity, dim))
+            self._dim = dim
+        self._generation = generation
+
+    def get_many(self, texts):
+        '''
+        Cached vector for each text, or None, in the order given.
+        '''
+        keys = [_cache_key(text) for text in texts]
+        vectors = [None] * len(keys)
+        with self._lock, self._read_lock:
+            if self._attach():
+                self._sync()
+                stored, used = self._table['key'], self._table['used']
+                now = time.time_ns()
+                for i, key in enumerate(keys):
+                    slot = self._slots.get(key)
+                    if slot is not None and stored[slot] == key:
+                        vectors[i] = np.array(self._matrix[slot])
+                        # Racing readers may overwrite each other's stamp; either is recent
+                        used[slot] = now
+            found = sum(vector is not None for vector in vectors)
+            self.hits += found
+            self.misses += len(keys) - found
+        return vectors
+
+    def put_many(self, texts, vectors):
+        '''
+        Store vectors for texts, evicting the least recently used entries when full.
+        '''
+        if not texts:
+            return
+        # Only the last `capacity` of an oversized batch would survive it
+        texts, vectors = texts[-self.capacity:], np.asarray(vectors, dtype=np.float32)[-self.capacity:]
+        with self._lock, self._write_lock:
+            self._attach(create=True)
+            self._sync()
+            if self._dim is None:
+                self._matrix = np.memmap(
+                    self._matrix_path, dtype=np.float32, mode='w+', shape=(self.capacity, vectors.shape[1]))
+                self._dim = self._header['dim'][0] = vectors.shape[1]
+            if self._dim != vectors.shape[1]:
+                raise ValueError(f'Embeddings for {self.model} have {self._dim} dimensions, got {vectors.shape[1]}')
+            stored, used = self._table['key'], self._table['used']
+            rows = []
+            for text, vector in zip(texts, vectors):
+                key = _cache_key(text)
+                slot = self._slots.get(key)
+                if slot is None:
+                    if self._free:
+                        slot = self._free.pop()
+                    else:
+                        slot = int(np.argmin(used))
+                        del self._slots[bytes(stored[slot])]
+                        # Freed before it is overwritten, so no key ever points at another's vector
+                        stored[slot] = b''
+                    # Not evicted again by the rest of this batch
+                    used[slot] = np.iinfo(np.uint64).max
+                self._matrix[slot] = vector
+                self._slots[key] = slot
+                rows.append((slot, key))
+            self._matrix.flush()
+            now = time.time_ns()
+            for slot, key in rows:
+                stored[slot] = key
+                used[slot] = now
+            self._generation = int(self._header['generation'][0]) + 1
+            self._header['generation'][0] = self._generation
+
+    def flush(self):
+        '''
+        Write the recency of cache hits to disk; other processes see it at once.
+        '''
+        with self._lock:
+            if self._table is not None:
+                self._table.flush()
+
+    def stats(self):
+        looked_up = self.hits + self.misses
+        return {
+            'size': len(self._slots),
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / looked_up if looked_up else 0.0,
+        }
+
+
+class CachedEmbeddingFunction:
+    '''
+    Wraps an embedding function (a callable from a list of texts to a list of
+    vectors, such as Chroma's OpenAIEmbeddingFunction) with an EmbeddingCache.
+    Only the texts that miss the cache are sent, in one call.
+    '''
+    def __init__(self, embedding_function, cache):
+        self.embedding_function = embedding_function
+        self.cache = cache
+
+    def __call__(self, input):
+        vectors = self.cache.get_many(input)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            fetched = self.embedding_function([input[i] for i in missing])
+            for i, vector in zip(missing, fetched):
+                vectors[i] = np.asarray(vector, dtype=np.float32)
+            self.cache.put_many([input[i] for i in missing], [vectors[i] for i in missing])
+        return vectors
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model):
+    '''
+    The process-wide EmbeddingCache for model.
+    '''
+    cache = _caches.get(model)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(model)
+            if cache is None:
+                cache = _caches[model] = EmbeddingCache(model)
+    return cache
+
+
+def get_embedding_cache_stats():
+    return {model: cache.stats() for model, cache in _caches.items()}
+
+
+@atexit.register
+def _flush_caches():
+    for cache in list(_caches.values()):
+        try:
+            cache.flush()
+        except Exception as e:
+            _logs.warning(f'Could not save embedding cache for {cache.model}: {e}')
@@ -0,0 +1,152 @@
+import threading
+import time
+from collections import deque
+
+from dotenv import load_dotenv
+import os
+
+from utils.http_client import http_get
+from utils.logger import get_logger
+from utils.spans import Histogram
+
+load_dotenv()
+
+# Refill when fewer facts than this are pooled, with one request for FACT_POOL_BATCH facts
+FACT_POOL_LOW_WATER = int(os.getenv('FACT_POOL_LOW_WATER', 10))
+FACT_POOL_BATCH = int(os.getenv('FACT_POOL_BATCH', 50))
+# Facts served recently are not pooled again, so a chat does not hear the same fact twice
+FACT_POOL_RECENT = int(os.getenv('FACT_POOL_RECENT', 32))
+
+_logs = get_logger(__name__)
+
+
+class FactPool:
+    '''
+    In-memory pool of facts from one source, refilled in bulk in the background.
+
+    take(n) serves facts from memory and removes them, and refills skip
+    facts that are still in the recent window, so a chat does not hear the
+    same fact twice. When the pool drops below the low-water mark a daemon
+    thread refills it with one large request. Only when the pool is empty
+    does a call fetch live: a whole batch, or just the facts it needs if the
+    batch request fails.
+    '''
+    def __init__(self, name, fetch, low_water = FACT_POOL_LOW_WATER,
+                 batch = FACT_POOL_BATCH, recent = FACT_POOL_RECENT):
+        self.name = name
+        self._fetch = fetch
+        self.low_water = low_water
+        self.batch = batch
+        self._facts = deque()
+        self._recent = deque(maxlen=recent)
+        self._lock = threading.Lock()
+        self._wanted = threading.Event()
+        self._refiller = None
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.refill_latency = Histogram()
+
+    def take(self, n = 1):
+        '''
+        n facts, from the pool where possible and fetched live for the rest.
+        '''
+        facts = self._pop(n)
+        with self._lock:
+            self.hits += len(facts)
+            self.misses += n - len(facts)
+        if len(facts) < n:
+            # Empty pool: fetch a whole batch now, serve from it and keep the rest
+            _logs.debug(f'{self.name} fact pool empty, fetching live')
+            try:
+                self.refill()
+                facts += self._pop(n - len(facts))
+            except Exception as e:
+                # A failed batch falls back to one direct fetch for just these facts
+                _logs.warning(f'Refilling {self.name} fact pool failed: {e}')
+            if len(facts) < n:
+                facts += self._fetch(n - len(facts))
+        if len(self._facts) < self.low_water:
+            self._request_refill()
+        return facts
+
+    def _pop(self, n):
+        with self._lock:
+            facts = [self._facts.popleft() for _ in range(min(n, len(self._facts)))]
+            self._recent.extend(facts)
+        return facts
+
+    def refill(self):
+        '''
+        Fetch one batch and pool the facts that are neither pooled nor recently served.
+        '''
+        start = time.perf_counter()
+        fetched = self._fetch(self.batch)
+        elapsed = time.perf_counter() - start
+        self.refill_latency.record(elapsed)
+        with self._lock:
+            known = set(self._facts) | set(self._recent)
+            added = 0
+            for fact in fetched:
+                if fact not in known:
+                    self._facts.append(fact)
+                    known.add(fact)
+                    added += 1
+            self.refills += 1
+        _logs.debug(f'Refilled {self.name} fact pool with {added} facts in {elapsed:.3f}s')
+        return added
+
+    def _request_refill(self):
+        if self._refiller is None:
+            with self._lock:
+                if self._refiller is None:
+                    self._refiller = threading.Thread(
+                        target=self._refill_loop, name=f'{self.name}-fact-pool', daemon=True)
+                    self._refiller.start()
+        self._wanted.set()
+
+    def _refill_loop(self):
+        while True:
+            self._wanted.wait()
+            self._wanted.clear()
+            try:
+                while len(self._facts) < self.low_water:
+                    if not self.refill():
+                        # The source has nothing new for now; try again on the next request
+                        break
+            except Exception as e:
+                _logs.warning(f'Refilling {self.name} fact pool failed: {e}')
+
+    def stats(self):
+        served = self.hits + self.misses
+        refill = self.refill_latency.summary()
+        return {
+            'size': len(self._facts),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / served if served else 0.0,
+            'refills': self.refills,
+            'refill_p50_s': refill['p50_s'],
+            'refill_max_s': refill['max_s'],
+        }
+
+
+def fetch_cat_facts(count):
+    response = http_get('https://meowfacts.herokuapp.com/', params={'count': count})
+    return response.json().get('data', [])
+
+
+def fetch_dog_facts(count):
+    response = http_get('http://dogapi.dog/api/v2/facts', params={'limit': count})
+    return [fact['attributes']['body'] for fact in response.json().get('data', [])]
+
+
+cat_facts = FactPool('cat', fetch_cat_facts)
+dog_facts = FactPool('dog', fetch_dog_facts)
+
+
+def get_fact_pool_stats():
+    '''
+    Hit rate, size and refill latency of every fact pool.
+    '''
+    return {pool.name: pool.stats() for pool in (cat_facts, dog_facts)}
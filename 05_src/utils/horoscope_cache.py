@@ -0,0 +1,178 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from dotenv import load_dotenv
+import os
+
+from utils.http_client import ahttp_get, http_get
+from utils.logger import get_logger
+
+load_dotenv()
+
+HOROSCOPE_API_URL = os.getenv(
+    'HOROSCOPE_API_URL', 'https://horoscope-app-api.vercel.app/api/v1/get-horoscope/daily')
+# Warm all signs for today in the background, and again after every midnight
+HOROSCOPE_PREFETCH = os.getenv('HOROSCOPE_PREFETCH', 'false').lower() in ('1', 'true', 'yes')
+
+SIGNS = (
+    'Aries', 'Taurus', 'Gemini', 'Cancer', 'Leo', 'Virgo',
+    'Libra', 'Scorpio', 'Sagittarius', 'Capricorn', 'Aquarius', 'Pisces',
+)
+
+_logs = get_logger(__name__)
+
+
+def normalize_day(day):
+    '''
+    The day as the service expects it: TODAY, TOMORROW, YESTERDAY or YYYY-MM-DD.
+    '''
+    return day.strip().upper()
+
+
+def _next_midnight():
+    tomorrow = date.today() + timedelta(days=1)
+    return datetime.combine(tomorrow, datetime.min.time()).timestamp()
+
+
+class HoroscopeCache:
+    '''
+    Cache of parsed horoscope service payloads keyed on (sign, day).
+
+    The key holds the day exactly as it is sent upstream, so a relative day
+    is keyed on its token (TODAY) rather than on a date that the service,
+    resolving it in its own timezone, might not agree with. Entries expire
+    at the next local midnight, when TODAY starts to mean another date.
+    Concurrent misses for the same key wait on a single in-flight request
+    instead of each calling the service. A non-OK response raises an HTTP
+    error and is not cached. get and aget share the entries, so sync and
+    async callers warm the same cache. Payloads are shared between callers
+    and must not be modified.
+    '''
+    def __init__(self, url = HOROSCOPE_API_URL, http_get = http_get, ahttp_get = ahttp_get):
+        self.url = url
+        self._http_get = http_get
+        self._ahttp_get = ahttp_get
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._in_flight = {}
+        self._async_in_flight = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > time.time():
+            self.hits += 1
+            return entry[0]
+        return None
+
+    def _store(self, key, payload):
+        self._entries[key] = (payload, _next_midnight())
+        self._evict_expired()
+
+    def get(self, sign, day = 'TODAY'):
+        '''
+        The service's JSON payload for sign on day.
+        '''
+        key = (sign.capitalize(), normalize_day(day))
+        with self._lock:
+            cached = self._lookup(key)
+            if cached is not None:
+                return cached
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = Future()
+                self._in_flight[key] = future
+        if not owner:
+            return future.result()
+
+        try:
+            payload = self._fetch(*key)
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._in_flight[key]
+            self._store(key, payload)
+        future.set_result(payload)
+        return payload
+
+    async def aget(self, sign, day = 'TODAY'):
+        '''
+        Async get for callers on one event loop; concurrent misses share one task.
+        '''
+        key = (sign.capitalize(), normalize_day(day))
+        with self._lock:
+            cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        task = self._async_in_flight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._afetch(key))
+            self._async_in_flight[key] = task
+            task.add_done_callback(lambda _: self._async_in_flight.pop(key, None))
+        # Shielded so one cancelled caller does not cancel the others' request
+        return await asyncio.shield(task)
+
+    async def _afetch(self, key):
+        sign, day = key
+        _logs.debug(f'Fetching horoscope for sign {sign}, and date {day}')
+        response = await self._ahttp_get(self.url, params={'sign': sign, 'day': day})
+        response.raise_for_status()
+        payload = response.json()
+        with self._lock:
+            self._store(key, payload)
+        return payload
+
+    def _fetch(self, sign, day):
+        _logs.debug(f'Fetching horoscope for sign {sign}, and date {day}')
+        response = self._http_get(self.url, params={'sign': sign, 'day': day})
+        response.raise_for_status()
+        return response.json()
+
+    def _evict_expired(self):
+        now = time.time()
+        for key in [key for key, (_, expires) in self._entries.items() if expires <= now]:
+            del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def prefetch(self, day = 'TODAY', max_workers = 4):
+        '''
+        Fetch every sign for the given day, in parallel; returns how many were cached.
+        '''
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(self.get, sign, day) for sign in SIGNS]
+        failures = [f.exception() for f in futures if f.exception() is not None]
+        for e in failures:
+            _logs.warning(f'Horoscope prefetch failed: {e}')
+        return len(SIGNS) - len(failures)
+
+    def start_prefetch(self):
+        '''
+        Warm today's horoscopes now and after every midnight, from a daemon thread.
+        '''
+        def run():
+            while True:
+                warmed = self.prefetch()
+                _logs.info(f'Prefetched {warmed}/{len(SIGNS)} horoscopes for today')
+                time.sleep(max(1.0, _next_midnight() - time.time() + 1))
+
+        thread = threading.Thread(target=run, name='horoscope-prefetch', daemon=True)
+        thread.start()
+        return thread
+
+
+horoscope_cache = HoroscopeCache()
+if HOROSCOPE_PREFETCH:
+    horoscope_cache.start_prefetch()
@@ -0,0 +1,229 @@
+import asyncio
+import random
+import threading
+from urllib.parse import urlsplit
+
+from dotenv import load_dotenv
+import httpx
+import os
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import EmptyPoolError
+from urllib3.util.retry import Retry
+
+from utils.logger import get_logger
+
+load_dotenv()
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3.05))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 10))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', 3))
+# Retries wait a random time up to HTTP_BACKOFF * 2 ** attempt seconds
+HTTP_BACKOFF = float(os.getenv('HTTP_BACKOFF', 0.3))
+HTTP_MAX_PER_HOST = int(os.getenv('HTTP_MAX_PER_HOST', 10))
+# Longest a request waits for one of its host's connections to be free
+HTTP_POOL_TIMEOUT = float(os.getenv('HTTP_POOL_TIMEOUT', 10))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_logs = get_logger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+_async_clients = {}
+
+
+def _retry_policy():
+    return Retry(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=HTTP_RETRIES,
+        status=HTTP_RETRIES,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        backoff_factor=HTTP_BACKOFF,
+        backoff_jitter=HTTP_BACKOFF,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+class _PoolTimeoutMixin:
+    '''
+    Wait at most HTTP_POOL_TIMEOUT for a free connection. requests never
+    passes a pool timeout, so a full blocking pool would otherwise wait forever.
+    '''
+    def urlopen(self, method, url, *args, pool_timeout = None, **kwargs):
+        if pool_timeout is None:
+            pool_timeout = HTTP_POOL_TIMEOUT
+        return super().urlopen(method, url, *args, pool_timeout=pool_timeout, **kwargs)
+
+
+class _HTTPConnectionPool(_PoolTimeoutMixin, HTTPConnectionPool):
+    pass
+
+
+class _HTTPSConnectionPool(_PoolTimeoutMixin, HTTPSConnectionPool):
+    pass
+
+
+class _PooledAdapter(HTTPAdapter):
+    '''
+    HTTPAdapter whose blocking per-host pools give up after HTTP_POOL_TIMEOUT.
+    '''
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _HTTPConnectionPool, 'https': _HTTPSConnectionPool}
+
+    def send(self, request, *args, **kwargs):
+        try:
+            return super().send(request, *args, **kwargs)
+        except EmptyPoolError as e:
+            raise requests.exceptions.ConnectTimeout(e, request=request)
+
+
+def get_session():
+    '''
+    The process-wide requests session.
+
+    Connections are kept alive and reused. Each host gets a pool of at most
+    HTTP_MAX_PER_HOST connections; callers beyond that wait for a free one,
+    for at most HTTP_POOL_TIMEOUT seconds before a ConnectTimeout.
+    Idempotent requests are retried on connection errors, read errors and
+    RETRY_STATUSES, with jittered exponential backoff.
+    '''
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = _PooledAdapter(
+                    pool_connections=HTTP_MAX_PER_HOST,
+                    pool_maxsize=HTTP_MAX_PER_HOST,
+                    pool_block=True,
+                    max_retries=_retry_policy())
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def http_get(url, params = None, timeout = None, **kwargs):
+    '''
+    GET through the pooled session with connect and read timeouts.
+    '''
+    timeout = timeout or (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    return get_session().get(url, params=params, timeout=timeout, **kwargs)
+
+
+class AsyncHTTPClient:
+    '''
+    Pooled httpx client for one event loop, with the same policy as get_session.
+
+    httpx only caps connections globally, so a semaphore per host enforces
+    HTTP_MAX_PER_HOST; waiting for it, like waiting for a pooled connection,
+    gives up with httpx.PoolTimeout after HTTP_POOL_TIMEOUT. Retries use full
+    jitter and honour Retry-After.
+    '''
+    def __init__(self, max_per_host = HTTP_MAX_PER_HOST, retries = HTTP_RETRIES):
+        self.max_per_host = max_per_host
+        self.retries = retries
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT, pool=HTTP_POOL_TIMEOUT),
+            limits=httpx.Limits(max_keepalive_connections=max_per_host * 4))
+        self._host_slots = {}
+
+    def _slots(self, url):
+        host = urlsplit(url).netloc
+        slots = self._host_slots.get(host)
+        if slots is None:
+            slots = self._host_slots[host] = asyncio.Semaphore(self.max_per_host)
+        return slots
+
+    async def _send(self, url, params, **kwargs):
+        slots = self._slots(url)
+        try:
+            await asyncio.wait_for(slots.acquire(), HTTP_POOL_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise httpx.PoolTimeout(f'No connection to {urlsplit(url).netloc} free within {HTTP_POOL_TIMEOUT}s')
+        try:
+            return await self._client.get(url, params=params, **kwargs)
+        finally:
+            slots.release()
+
+    async def get(self, url, params = None, timeout = None, **kwargs):
+        if timeout is not None:
+            kwargs['timeout'] = httpx.Timeout(timeout[1], connect=timeout[0])
+        attempt = 0
+        while True:
+            try:
+                response = await self._send(url, params, **kwargs)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    return response
+                delay = _retry_after(response)
+            except httpx.TransportError as e:
+                # A pool timeout has already waited its share
+                if attempt >= self.retries or isinstance(e, httpx.PoolTimeout):
+                    raise
+                delay = None
+                _logs.debug(f'Retrying GET {url} after {e!r}')
+            if delay is None:
+                delay = random.uniform(0, HTTP_BACKOFF * 2 ** attempt)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    @property
+    def closed(self):
+        return self._client.is_closed
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+def _retry_after(response):
+    try:
+        return min(float(response.headers.get('Retry-After')), HTTP_READ_TIMEOUT)
+    except (TypeError, ValueError):
+        return None
+
+
+async def _close_at_shutdown(client):
+    '''
+    Suspended for the life of the loop. asyncio.run, like other loop runners,
+    finalizes live async generators before it closes the loop, which runs
+    the finally clause while the client's connections can still be closed.
+    '''
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+def get_async_client():
+    '''
+    The pooled async client of the running event loop, created on first use
+    and closed when the loop shuts down.
+    '''
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        for other in [other for other in _async_clients if other.is_closed()]:
+            if not _async_clients[other].closed:
+                # Its loop was closed without finalizing async generators
+                _logs.warning('Dropping an HTTP client whose event loop closed before it could be closed')
+            del _async_clients[other]
+        client = _async_clients[loop] = AsyncHTTPClient()
+        # Held by the client: the loop keeps only a weak reference to it
+        client._shutdown_hook = _close_at_shutdown(client)
+        asyncio.ensure_future(client._shutdown_hook.__anext__())
+    return client
+
+
+async def ahttp_get(url, params = None, timeout = None, **kwargs):
+    '''
+    Async GET through the event loop's pooled client.
+    '''
+    return await get_async_client().get(url, params=params, timeout=timeout, **kwargs)
@@ -1,4 +1,9 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import threading
 from datetime import datetime
 
 from dotenv import load_dotenv
@@ -8,27 +13,83 @@ load_dotenv()
 
 LOG_DIR = os.getenv('LOG_DIR', './logs/')
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+# 'text' (default) or 'json' for one JSON object per line in the log file
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+
+# log_dir -> (queue, listener); one listener and log file per directory
+_listeners = {}
+_listener_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    '''
+    Format records as JSON lines with the same fields as the text log file.
+    '''
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'name': record.name,
+            'filename': record.filename,
+            'lineno': record.lineno,
+            'funcName': record.funcName,
+            'levelname': record.levelname,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _get_queue(log_dir):
+    '''
+    The queue of the listener thread that owns the real handlers for log_dir.
+
+    Loggers only put records on a queue; formatting and disk I/O happen on the
+    listener thread, so logging on the request path never blocks on the file.
+    All loggers with the same log_dir share one rotating log file per process.
+    '''
+    log_dir = os.path.abspath(log_dir)
+    with _listener_lock:
+        if log_dir in _listeners:
+            return _listeners[log_dir][0]
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+
+        f_handler = logging.handlers.RotatingFileHandler(
+            os.path.join(log_dir, f'{ datetime.now().strftime("%Y%m%d_%H%M%S") }.log'),
+            maxBytes=LOG_MAX_BYTES,
+            backupCount=LOG_BACKUP_COUNT)
+        if LOG_FORMAT == 'json':
+            f_format = JsonFormatter()
+        else:
+            f_format = logging.Formatter('%(asctime)s, %(name)s, %(filename)s, %(lineno)d, %(funcName)s, %(levelname)s, %(message)s')
+        f_handler.setFormatter(f_format)
+
+        s_handler = logging.StreamHandler()
+        s_format = logging.Formatter('%(asctime)s, %(filename)s, %(lineno)d, %(levelname)s, %(message)s')
+        s_handler.setFormatter(s_format)
+
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(
+            log_queue, f_handler, s_handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        _listeners[log_dir] = (log_queue, listener)
+        return log_queue
+
 
 def get_logger(name, log_dir = LOG_DIR, log_level = LOG_LEVEL):
 
     '''
-    Set up a logger with the given name and log level.
+    Set up a logger with the given name and log level, writing to log_dir.
     '''
     _logs = logging.getLogger(name)
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-    
-    f_handler = logging.FileHandler(os.path.join(log_dir, f'{ datetime.now().strftime("%Y%m%d_%H%M%S") }.log'))
-    f_format = logging.Formatter('%(asctime)s, %(name)s, %(filename)s, %(lineno)d, %(funcName)s, %(levelname)s, %(message)s')
-    f_handler.setFormatter(f_format)
-    
-    s_handler = logging.StreamHandler()
-    s_format = logging.Formatter('%(asctime)s, %(filename)s, %(lineno)d, %(levelname)s, %(message)s')
-    s_handler.setFormatter(s_format)
-    
-    if not len(_logs.handlers):
-        _logs.addHandler(f_handler)
-        _logs.addHandler(s_handler)
-    
+    log_queue = _get_queue(log_dir)
+
+    if not any(getattr(handler, 'queue', None) is log_queue for handler in _logs.handlers):
+        _logs.addHandler(logging.handlers.QueueHandler(log_queue))
+
     _logs.setLevel(log_level)
     return _logs
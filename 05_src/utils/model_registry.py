@@ -0,0 +1,52 @@
+import json
+import threading
+
+from langchain.chat_models import init_chat_model
+
+from utils.logger import get_logger
+
+_logs = get_logger(__name__)
+
+_lock = threading.Lock()
+# (model, params) -> chat model
+_models = {}
+# (model, params, tool ids) -> (tools, bound model); the tools are kept so their ids are never reused
+_bound = {}
+
+
+def _params_key(params):
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+def get_chat_model(model, tools = (), **params):
+    '''
+    A chat model for model and params, with tools bound, built once per process.
+
+    Every combination shares one underlying model, and with it one client and
+    its connection pool, so graph steps and requests reuse connections instead
+    of rebuilding clients and tool schemas.
+    '''
+    model_key = (model, _params_key(params))
+    tool_ids = tuple(id(tool) for tool in tools)
+    key = model_key + (tool_ids,)
+    cached = _bound.get(key)
+    if cached is not None:
+        return cached[1]
+
+    with _lock:
+        cached = _bound.get(key)
+        if cached is not None:
+            return cached[1]
+        chat_model = _models.get(model_key)
+        if chat_model is None:
+            _logs.info(f'Initializing chat model {model} with {params}')
+            chat_model = _models[model_key] = init_chat_model(model, **params)
+        bound = chat_model.bind_tools(list(tools)) if tools else chat_model
+        _bound[key] = (tuple(tools), bound)
+        return bound
+
+
+def clear_chat_models():
+    with _lock:
+        _models.clear()
+        _bound.clear()
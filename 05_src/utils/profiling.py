@@ -0,0 +1,187 @@
+import functools
+import inspect
+import itertools
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from dotenv import load_dotenv
+import os
+
+from utils.logger import get_logger, LOG_DIR
+
+load_dotenv()
+
+# Profile one in every N requests; 1 profiles every request and 0 turns profiling off
+PROFILE_SAMPLE_RATE = int(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', 5))
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(LOG_DIR, 'profiles'))
+
+_logs = get_logger(__name__)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    '''
+    Sample the stack of one thread from a background thread.
+
+    The profiled code runs untouched; every interval the sampler reads the
+    thread's current frame and counts its stack. Results are written in the
+    collapsed-stack format ("outer;inner;leaf count"), which flamegraph.pl,
+    speedscope and most flamegraph viewers load directly.
+    '''
+    def __init__(self, thread_id = None, interval = PROFILE_INTERVAL_MS / 1000):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name='profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def collapsed(self):
+        return '\n'.join(f'{stack} {count}' for stack, count in self.stacks.most_common()) + '\n'
+
+    def dump(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(self.collapsed())
+        return path
+
+
+def profiled(name, sample_rate = PROFILE_SAMPLE_RATE, profile_dir = PROFILE_DIR):
+    '''
+    Profile one in every sample_rate calls of a request handler.
+
+    Sampled calls write a collapsed-stack file to profile_dir. With a sample
+    rate of 0 the handler is returned as is, so there is no overhead at all.
+    '''
+    def decorator(func):
+        if sample_rate <= 0:
+            return func
+        calls = itertools.count()
+
+        def dump(n, profiler, elapsed):
+            path = os.path.join(
+                profile_dir, f'{name}_{datetime.now().strftime("%Y%m%d_%H%M%S")}_{n}.folded')
+            try:
+                profiler.dump(path)
+                _logs.info(f'Profiled {name} request {n} ({elapsed:.3f}s): {path}')
+            except OSError as e:
+                # A failed dump must not fail the request it profiled
+                _logs.warning(f'Could not write profile {path}: {e}')
+
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def agen_wrapper(*args, **kwargs):
+                n = next(calls)
+                agen = func(*args, **kwargs)
+                if n % sample_rate:
+                    async for item in agen:
+                        yield item
+                    return
+                # Samples cover the event loop thread, so other sessions
+                # running between this handler's awaits show up as well
+                total = SamplingProfiler()
+                start = time.perf_counter()
+                try:
+                    while True:
+                        with SamplingProfiler() as step:
+                            try:
+                                item = await agen.__anext__()
+                            except StopAsyncIteration:
+                                item = step
+                        total.stacks.update(step.stacks)
+                        if item is step:
+                            return
+                        yield item
+                finally:
+                    await agen.aclose()
+                    dump(n, total, time.perf_counter() - start)
+            return agen_wrapper
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                n = next(calls)
+                if n % sample_rate:
+                    return await func(*args, **kwargs)
+                profiler = SamplingProfiler()
+                start = time.perf_counter()
+                try:
+                    with profiler:
+                        return await func(*args, **kwargs)
+                finally:
+                    dump(n, profiler, time.perf_counter() - start)
+            return async_wrapper
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def gen_wrapper(*args, **kwargs):
+                n = next(calls)
+                if n % sample_rate:
+                    return (yield from func(*args, **kwargs))
+                # Streaming handlers may resume on a different thread after
+                # every yield, so each step gets its own sampler
+                total = SamplingProfiler()
+                start = time.perf_counter()
+                gen = func(*args, **kwargs)
+                try:
+                    while True:
+                        with SamplingProfiler() as step:
+                            try:
+                                item = next(gen)
+                            except StopIteration as stop:
+                                item = stop
+                        total.stacks.update(step.stacks)
+                        if isinstance(item, StopIteration):
+                            return item.value
+                        yield item
+                finally:
+                    gen.close()
+                    dump(n, total, time.perf_counter() - start)
+            return gen_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            n = next(calls)
+            if n % sample_rate:
+                return func(*args, **kwargs)
+            profiler = SamplingProfiler()
+            start = time.perf_counter()
+            try:
+                with profiler:
+                    return func(*args, **kwargs)
+            finally:
+                dump(n, profiler, time.perf_counter() - start)
+        return wrapper
+    return decorator
@@ -0,0 +1,91 @@
+import functools
+import threading
+
+from dotenv import load_dotenv
+import os
+
+from utils.logger import get_logger
+from utils.spans import timed
+
+load_dotenv()
+load_dotenv(".secrets")
+
+_logs = get_logger(__name__)
+
+_engine = None
+_engine_lock = threading.Lock()
+
+# The query text; compiled once, on first use, by _details_query
+_DETAILS_SQL = """
+    SELECT r.reviewid,
+        r.title,
+        r.artist,
+        r.score,
+        g.genre
+    FROM reviews AS r
+    LEFT JOIN genres AS g
+        ON r.reviewid = g.reviewid
+    WHERE r.reviewid IN :review_ids
+    """
+
+
+@functools.cache
+def _details_query():
+    import sqlalchemy as sa
+    return sa.text(_DETAILS_SQL).bindparams(sa.bindparam('review_ids', expanding=True))
+
+
+def get_engine(url = None):
+    '''
+    The process-wide engine for SQL_URL, with a connection pool shared by all requests.
+    '''
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                # SQLAlchemy is slow to import; only load it when the database is first used
+                import sqlalchemy as sa
+                _engine = sa.create_engine(
+                    url or os.getenv('SQL_URL'), pool_pre_ping=True, pool_recycle=1800)
+    return _engine
+
+
+@timed('sql', 'review_details')
+def fetch_review_details(review_ids, engine = None):
+    '''
+    Album details for each review id, in the order given, with one parameterized query.
+
+    A review with several genres comes back once with all of them in 'genres'.
+    Ids with no review get an empty dict.
+    '''
+    unique_ids = list(dict.fromkeys(review_ids))
+    if not unique_ids:
+        return []
+    engine = engine or get_engine()
+    with engine.connect() as conn:
+        rows = conn.execute(_details_query(), {'review_ids': unique_ids}).all()
+
+    details_by_id = {}
+    for row in rows:
+        details = details_by_id.get(str(row.reviewid))
+        if details is None:
+            details = details_by_id[str(row.reviewid)] = {
+                'reviewid': row.reviewid,
+                'album': row.title,
+                'score': row.score,
+                'artist': row.artist,
+                'genres': [],
+            }
+        if row.genre is not None and row.genre not in details['genres']:
+            details['genres'].append(row.genre)
+
+    results = []
+    for review_id in review_ids:
+        details = details_by_id.get(str(review_id))
+        if details is None:
+            _logs.warning(f'No details found for review ID: {review_id}')
+            results.append({})
+        else:
+            # Callers add to the dict, so repeated ids must not share it
+            results.append(dict(details, genres=list(details['genres'])))
+    return results
@@ -0,0 +1,341 @@
+import atexit
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+import os
+
+from utils.logger import get_logger
+
+load_dotenv()
+
+# Seconds between latency summaries written to the log; 0 disables them
+SPAN_SUMMARY_INTERVAL = float(os.getenv('SPAN_SUMMARY_INTERVAL', 300))
+# Port of the Prometheus-style scrape endpoint; 0 disables it
+SPAN_METRICS_PORT = int(os.getenv('SPAN_METRICS_PORT', 0))
+# Interface the scrape endpoint listens on; loopback unless set to e.g. 0.0.0.0
+SPAN_METRICS_HOST = os.getenv('SPAN_METRICS_HOST', '127.0.0.1')
+# Number of recent samples per histogram used for the percentiles
+SPAN_WINDOW = int(os.getenv('SPAN_WINDOW', 2048))
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_logs = get_logger(__name__)
+
+
+class Histogram:
+    '''
+    Latency histogram over a window of recent samples.
+
+    Recording is O(1); percentiles are computed when a summary is requested.
+    '''
+    def __init__(self, window = SPAN_WINDOW):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def summary(self):
+        with self._lock:
+            samples = sorted(self._samples)
+            count, total, largest = self.count, self.total, self.max
+        stats = {'count': count, 'mean_s': total / count if count else 0.0, 'max_s': largest}
+        for q in QUANTILES:
+            key = f'p{round(q * 100)}_s'
+            stats[key] = samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0.0
+        return stats
+
+
+class _RequestTimings:
+    '''
+    Time spent per span kind during one request.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.by_kind = {}
+
+    def add(self, kind, seconds):
+        with self._lock:
+            self.by_kind[kind] = self.by_kind.get(kind, 0.0) + seconds
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+_request = contextvars.ContextVar('span_request', default=None)
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def _histogram(key):
+    histogram = _histograms.get(key)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(key, Histogram())
+    return histogram
+
+
+def record(kind, name, seconds):
+    '''
+    Record a duration for a span kind ('llm', 'tool', 'vector', 'sql', ...) and name.
+    '''
+    _histogram((kind, name)).record(seconds)
+    timings = _request.get()
+    if timings is not None:
+        timings.add(kind, seconds)
+
+
+@contextmanager
+def span(kind, name):
+    '''
+    Time the enclosed block and record it under kind and name.
+    '''
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(kind, name, time.perf_counter() - start)
+
+
+def timed(kind, name = None):
+    '''
+    Decorator form of span, for plain and async functions.
+    '''
+    def decorator(func):
+        span_name = name or func.__name__
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(kind, span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(kind, span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _RequestScope:
+    '''
+    The timings of one request, made current only while its code runs.
+
+    A streaming handler runs a step at a time, and the server may drive each
+    step from a different thread or task, so the request is set and reset
+    around every step rather than held across yields.
+    '''
+    def __init__(self, name):
+        _start_exporters()
+        self.name = name
+        self.timings = _RequestTimings()
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def active(self):
+        token = _request.set(self.timings)
+        try:
+            yield self.timings
+        finally:
+            _request.reset(token)
+
+    def finish(self):
+        elapsed = time.perf_counter() - self.start
+        _histogram(('request', self.name)).record(elapsed)
+        breakdown = ', '.join(
+            f'{kind}={seconds:.3f}s' for kind, seconds in sorted(self.timings.by_kind.items()))
+        _logs.info(f'Request {self.name} took {elapsed:.3f}s ({breakdown or "no spans"})')
+
+
+class request_span:
+    '''
+    Time one chat turn and log how it splits across span kinds.
+
+    Use it as a context manager, or as a decorator on a plain, async,
+    generator or async generator handler; a streaming handler is timed from
+    its first step until it finishes or is closed. Spans opened by the turn,
+    including in threads that copy the current context, add to its breakdown.
+    '''
+    def __init__(self, name):
+        self.name = name
+        self._scopes = []
+
+    def __enter__(self):
+        scope = _RequestScope(self.name)
+        active = scope.active()
+        self._scopes.append((scope, active))
+        return active.__enter__()
+
+    def __exit__(self, *exc_info):
+        scope, active = self._scopes.pop()
+        try:
+            return active.__exit__(*exc_info)
+        finally:
+            scope.finish()
+
+    def __call__(self, func):
+        name = self.name
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def async_gen_wrapper(*args, **kwargs):
+                scope = _RequestScope(name)
+                stream = func(*args, **kwargs)
+                try:
+                    sent = None
+                    while True:
+                        with scope.active():
+                            try:
+                                item = await stream.asend(sent)
+                            except StopAsyncIteration:
+                                return
+                        sent = yield item
+                finally:
+                    with scope.active():
+                        await stream.aclose()
+                    scope.finish()
+            return async_gen_wrapper
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def gen_wrapper(*args, **kwargs):
+                scope = _RequestScope(name)
+                stream = func(*args, **kwargs)
+                try:
+                    sent = None
+                    while True:
+                        with scope.active():
+                            try:
+                                item = stream.send(sent)
+                            except StopIteration as stop:
+                                return stop.value
+                        sent = yield item
+                finally:
+                    with scope.active():
+                        stream.close()
+                    scope.finish()
+            return gen_wrapper
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with request_span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with request_span(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def get_span_summary():
+    '''
+    Percentiles per (kind, name), e.g. {('llm', 'responses.create'): {'p50_s': ...}}.
+    '''
+    with _histograms_lock:
+        items = list(_histograms.items())
+    return {key: histogram.summary() for key, histogram in sorted(items)}
+
+
+def format_prometheus(summary = None):
+    '''
+    Render the histograms as a Prometheus text-format summary metric.
+    '''
+    summary = get_span_summary() if summary is None else summary
+    lines = [
+        '# HELP span_duration_seconds Duration of instrumented spans.',
+        '# TYPE span_duration_seconds summary',
+    ]
+    for (kind, name), stats in summary.items():
+        labels = f'kind="{kind}",name="{name}"'
+        for q in QUANTILES:
+            value = stats[f'p{round(q * 100)}_s']
+            lines.append(f'span_duration_seconds{{{labels},quantile="{q}"}} {value}')
+        lines.append(f'span_duration_seconds_sum{{{labels}}} {stats["mean_s"] * stats["count"]}')
+        lines.append(f'span_duration_seconds_count{{{labels}}} {stats["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def log_span_summary():
+    '''
+    Write the current percentiles to the log, one line per span.
+    '''
+    for (kind, name), stats in get_span_summary().items():
+        _logs.info(
+            f'Span {kind}:{name} n={stats["count"]} p50={stats["p50_s"]:.3f}s '
+            f'p95={stats["p95_s"]:.3f}s p99={stats["p99_s"]:.3f}s max={stats["max_s"]:.3f}s')
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') != '/metrics':
+            self.send_error(404)
+            return
+        body = format_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        _logs.debug(f'Metrics scrape: {format % args}')
+
+
+def start_metrics_server(port = SPAN_METRICS_PORT, host = SPAN_METRICS_HOST):
+    '''
+    Serve the histograms at http://<host>:<port>/metrics from a daemon thread.
+    '''
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='span-metrics', daemon=True).start()
+    _logs.info(f'Serving span metrics on {host}:{server.server_address[1]}')
+    return server
+
+
+def start_summary_reporter(interval = SPAN_SUMMARY_INTERVAL):
+    '''
+    Log a latency summary every interval seconds, and once more at exit.
+    '''
+    stop = threading.Event()
+
+    def report():
+        last_count = 0
+        while not stop.wait(interval):
+            count = sum(stats['count'] for stats in get_span_summary().values())
+            if count != last_count:
+                log_span_summary()
+                last_count = count
+
+    threading.Thread(target=report, name='span-summary', daemon=True).start()
+    atexit.register(log_span_summary)
+    return stop
+
+
+def _start_exporters():
+    global _exporters_started
+    if _exporters_started:
+        return
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+        if SPAN_SUMMARY_INTERVAL > 0:
+            start_summary_reporter()
+        if SPAN_METRICS_PORT > 0:
+            start_metrics_server()
@@ -0,0 +1,211 @@
+import json
+import threading
+
+from dotenv import load_dotenv
+import numpy as np
+import os
+
+from utils.logger import get_logger
+
+load_dotenv()
+
+# IVF lists scanned per query; more lists means better recall and slower queries
+VECTOR_NPROBE = int(os.getenv('VECTOR_NPROBE', 8))
+
+_logs = get_logger(__name__)
+
+
+def _normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores, k):
+    '''
+    Positions of the k highest scores in each row, best first.
+    '''
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def _kmeans(vectors, nlist, iterations = 10, seed = 0):
+    '''
+    Spherical k-means: unit-length centroids, assigned by dot product.
+    '''
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for i in range(nlist):
+            members = vectors[assignments == i]
+            if len(members):
+                centroids[i] = members.sum(axis=0)
+            else:
+                # Restart an empty list on a random vector
+                centroids[i] = vectors[rng.integers(len(vectors))]
+        centroids = _normalize_rows(centroids)
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+def build_index(index_dir, ids, embeddings, documents = None, metadatas = None, nlist = 0):
+    '''
+    Write a vector index to index_dir: normalized float32 rows in vectors.f32
+    and ids, documents and metadatas in records.json. With nlist > 0, the rows
+    are also partitioned into nlist IVF lists by spherical k-means.
+    '''
+    os.makedirs(index_dir, exist_ok=True)
+    vectors = _normalize_rows(embeddings)
+    meta = {'count': len(vectors), 'dim': int(vectors.shape[1]), 'nlist': 0}
+    if nlist:
+        centroids, assignments = _kmeans(vectors, nlist)
+        # Store the rows list by list, so each list is one contiguous slice of the file
+        order = np.argsort(assignments, kind='stable')
+        vectors = vectors[order]
+        ids = [ids[i] for i in order]
+        documents = [documents[i] for i in order] if documents is not None else None
+        metadatas = [metadatas[i] for i in order] if metadatas is not None else None
+        offsets = np.searchsorted(assignments[order], np.arange(nlist + 1)).astype(np.int64)
+        np.save(os.path.join(index_dir, 'centroids.npy'), centroids)
+        np.save(os.path.join(index_dir, 'offsets.npy'), offsets)
+        meta['nlist'] = nlist
+
+    matrix = np.memmap(os.path.join(index_dir, 'vectors.f32'), dtype=np.float32, mode='w+', shape=vectors.shape)
+    matrix[:] = vectors
+    matrix.flush()
+    del matrix
+    with open(os.path.join(index_dir, 'records.json'), 'w', encoding='utf-8') as f:
+        json.dump({'ids': list(ids), 'documents': documents, 'metadatas': metadatas}, f)
+    # Written last: an index directory without meta.json is incomplete
+    with open(os.path.join(index_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    _logs.info(f'Wrote vector index of {meta["count"]} x {meta["dim"]} to {index_dir} with {nlist} IVF lists')
+    return meta
+
+
+def export_collection(collection, index_dir, nlist = 0, page_size = 1000):
+    '''
+    Copy a Chroma collection, with its embeddings, into a vector index in index_dir.
+    '''
+    ids, embeddings, documents, metadatas = [], [], [], []
+    offset = 0
+    while True:
+        page = collection.get(
+            include=['embeddings', 'documents', 'metadatas'], limit=page_size, offset=offset)
+        if not len(page['ids']):
+            break
+        ids.extend(page['ids'])
+        embeddings.extend(page['embeddings'])
+        documents.extend(page['documents'])
+        metadatas.extend(page['metadatas'])
+        offset += len(page['ids'])
+        _logs.debug(f'Exported {offset} records from {collection.name}')
+    return build_index(index_dir, ids, np.asarray(embeddings), documents, metadatas, nlist=nlist)
+
+
+class MmapVectorIndex:
+    '''
+    In-process vector index over a memory-mapped float32 matrix.
+
+    Answers the query() calls that get_context_data makes of a Chroma
+    collection, by precomputed embeddings only, so it can stand in for the
+    collection without a network hop. Scores are cosine similarities and
+    distances are 1 - similarity. Without IVF lists every row is scored; with
+    them only the nprobe lists nearest the query are.
+    '''
+    def __init__(self, index_dir, nprobe = VECTOR_NPROBE):
+        with open(os.path.join(index_dir, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        self.name = os.path.basename(os.path.normpath(index_dir))
+        self.nprobe = nprobe
+        self._vectors = np.memmap(
+            os.path.join(index_dir, 'vectors.f32'), dtype=np.float32, mode='r',
+            shape=(meta['count'], meta['dim']))
+        with open(os.path.join(index_dir, 'records.json'), encoding='utf-8') as f:
+            records = json.load(f)
+        self._ids = records['ids']
+        self._documents = records['documents']
+        self._metadatas = records['metadatas']
+        self._centroids = self._offsets = None
+        if meta['nlist']:
+            self._centroids = np.load(os.path.join(index_dir, 'centroids.npy'))
+            self._offsets = np.load(os.path.join(index_dir, 'offsets.npy'))
+
+    def count(self):
+        return len(self._ids)
+
+    def search(self, query_embeddings, k):
+        '''
+        Row numbers and cosine similarities of the k nearest rows to each query, nearest first.
+        '''
+        queries = _normalize_rows(np.atleast_2d(query_embeddings))
+        if self._centroids is None:
+            scores = queries @ self._vectors.T
+            top = _top_k(scores, k)
+            return top, np.take_along_axis(scores, top, axis=1)
+
+        rows, similarities = [], []
+        lists = _top_k(queries @ self._centroids.T, self.nprobe)
+        for query, probed in zip(queries, lists):
+            candidates = np.concatenate([
+                np.arange(self._offsets[i], self._offsets[i + 1]) for i in sorted(probed)])
+            scores = self._vectors[candidates] @ query
+            top = _top_k(scores[None, :], k)[0]
+            rows.append(candidates[top])
+            similarities.append(scores[top])
+        return rows, similarities
+
+    def query(self, query_embeddings, n_results = 10, include = ('documents', 'metadatas', 'distances')):
+        '''
+        Nearest records to each query embedding, shaped like Chroma's Collection.query result.
+        '''
+        rows, similarities = self.search(query_embeddings, n_results)
+        result = {'ids': [[self._ids[i] for i in found] for found in rows]}
+        if 'documents' in include:
+            result['documents'] = [
+                [self._documents[i] if self._documents else None for i in found] for found in rows]
+        if 'metadatas' in include:
+            result['metadatas'] = [
+                [self._metadatas[i] if self._metadatas else None for i in found] for found in rows]
+        if 'distances' in include:
+            result['distances'] = [(1.0 - np.asarray(found)).tolist() for found in similarities]
+        return result
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_vector_index(index_dir):
+    '''
+    The process-wide MmapVectorIndex for index_dir, opened on first use.
+    '''
+    index = _indexes.get(index_dir)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(index_dir)
+            if index is None:
+                _logs.info(f'Opening vector index at {index_dir}')
+                index = _indexes[index_dir] = MmapVectorIndex(index_dir)
+    return index
+
+
+if __name__ == '__main__':
+    import argparse
+
+    import chromadb
+
+    parser = argparse.ArgumentParser(description='Export a Chroma collection to an in-process vector index.')
+    parser.add_argument('index_dir')
+    parser.add_argument('--collection', default='pitchfork_reviews')
+    parser.add_argument('--chroma-url', default='http://localhost:8000')
+    parser.add_argument('--nlist', type=int, default=0, help='IVF lists; 0 scores every row')
+    args = parser.parse_args()
+    chroma = chromadb.HttpClient(host=args.chroma_url)
+    export_collection(chroma.get_collection(args.collection), args.index_dir, nlist=args.nlist)